@@ -0,0 +1,31 @@
+"""scheduler_leases
+
+Revision ID: a3d9e6f0c218
+Revises: f2c84b6e1a07
+Create Date: 2026-10-17 18:12:40.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# идентификаторы изменений
+revision = 'a3d9e6f0c218'
+down_revision = 'f2c84b6e1a07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'scheduler_leases',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('owner', sa.String(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('last_run', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('scheduler_leases')
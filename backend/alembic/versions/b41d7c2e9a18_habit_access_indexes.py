@@ -0,0 +1,69 @@
+"""habit_access_indexes
+
+Revision ID: b41d7c2e9a18
+Revises: 0c622d42c20c
+Create Date: 2026-10-17 10:12:41.530214
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# идентификаторы изменений
+revision = 'b41d7c2e9a18'
+down_revision = '0c622d42c20c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # дубликаты (user_id, name) могли появиться из-за гонки в старой проверке — переименовываем их
+    op.execute(
+        """
+        UPDATE habits SET name = name || ' (' || id || ')'
+        WHERE id IN (
+            SELECT h.id FROM habits h
+            WHERE EXISTS (
+                SELECT 1 FROM habits d
+                WHERE d.user_id = h.user_id AND d.name = h.name AND d.id < h.id
+            )
+        )
+        """
+    )
+
+    is_postgres = op.get_bind().dialect.name == "postgresql"
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_habits_user_id_is_active', 'habits', ['user_id', 'is_active'],
+            unique=False, postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_habits_carry_over', 'habits', ['id', 'last_completed'],
+            unique=False, postgresql_concurrently=True,
+            postgresql_where=sa.text('completion_count < 21'),
+            sqlite_where=sa.text('completion_count < 21')
+        )
+        op.create_index(
+            'uq_habits_user_id_name', 'habits', ['user_id', 'name'],
+            unique=True, postgresql_concurrently=True
+        )
+        op.create_index(
+            op.f('ix_users_username'), 'users', ['username'],
+            unique=False, postgresql_concurrently=True
+        )
+    if is_postgres:
+        op.execute(
+            'ALTER TABLE habits ADD CONSTRAINT uq_habits_user_id_name '
+            'UNIQUE USING INDEX uq_habits_user_id_name'
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_constraint('uq_habits_user_id_name', 'habits', type_='unique')
+    else:
+        op.drop_index('uq_habits_user_id_name', table_name='habits')
+    op.drop_index(op.f('ix_users_username'), table_name='users')
+    op.drop_index('ix_habits_carry_over', table_name='habits')
+    op.drop_index('ix_habits_user_id_is_active', table_name='habits')
@@ -0,0 +1,41 @@
+"""schedule_changes
+
+Revision ID: b7d2e5f91c30
+Revises: e9c4a7b2d815
+Create Date: 2026-10-18 16:20:51.472093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# идентификаторы изменений
+revision = 'b7d2e5f91c30'
+down_revision = 'e9c4a7b2d815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'schedule_changes',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_schedule_changes_created_at', 'schedule_changes', ['created_at'])
+    # общий счётчик заменён журналом изменений по пользователям
+    op.drop_table('schedule_version')
+
+
+def downgrade():
+    schedule_version = op.create_table(
+        'schedule_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(schedule_version, [{'id': 1, 'version': 0}])
+    op.drop_index('ix_schedule_changes_created_at', table_name='schedule_changes')
+    op.drop_table('schedule_changes')
@@ -0,0 +1,24 @@
+"""users_digest_times
+
+Revision ID: c8f1d2a4b597
+Revises: a3d9e6f0c218
+Create Date: 2026-10-17 19:40:11.304562
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# идентификаторы изменений
+revision = 'c8f1d2a4b597'
+down_revision = 'a3d9e6f0c218'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('digest_times', sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('users', 'digest_times')
@@ -0,0 +1,45 @@
+"""reminder_outbox
+
+Revision ID: d4b7a9e2c361
+Revises: c8f1d2a4b597
+Create Date: 2026-10-17 21:05:37.118420
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# идентификаторы изменений
+revision = 'd4b7a9e2c361'
+down_revision = 'c8f1d2a4b597'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'reminder_outbox',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+        sa.Column('dedup_key', sa.String(), nullable=False),
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('reply_markup', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(), server_default='pending', nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('available_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('claim_token', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('dedup_key')
+    )
+    op.create_index(
+        'ix_reminder_outbox_status_available_at', 'reminder_outbox', ['status', 'available_at'], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_reminder_outbox_status_available_at', table_name='reminder_outbox')
+    op.drop_table('reminder_outbox')
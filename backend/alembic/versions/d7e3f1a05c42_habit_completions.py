@@ -0,0 +1,36 @@
+"""habit_completions
+
+Revision ID: d7e3f1a05c42
+Revises: b41d7c2e9a18
+Create Date: 2026-10-17 14:02:18.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# идентификаторы изменений
+revision = 'd7e3f1a05c42'
+down_revision = 'b41d7c2e9a18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'habit_completions',
+        sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+        sa.Column('habit_id', sa.Integer(), nullable=False),
+        sa.Column('completed_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['habit_id'], ['habits.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(
+        'ix_habit_completions_habit_id_completed_at', 'habit_completions',
+        ['habit_id', 'completed_at'], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_habit_completions_habit_id_completed_at', table_name='habit_completions')
+    op.drop_table('habit_completions')
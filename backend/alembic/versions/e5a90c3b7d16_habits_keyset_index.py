@@ -0,0 +1,39 @@
+"""habits_keyset_index
+
+Revision ID: e5a90c3b7d16
+Revises: d7e3f1a05c42
+Create Date: 2026-10-17 15:26:07.318560
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# идентификаторы изменений
+revision = 'e5a90c3b7d16'
+down_revision = 'd7e3f1a05c42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # id в конце индекса отдаёт страницу WHERE user_id = ? AND is_active AND id > ? ORDER BY id без сортировки
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_habits_user_id_is_active_id', 'habits', ['user_id', 'is_active', 'id'],
+            unique=False, postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_habits_user_id_is_active', table_name='habits', postgresql_concurrently=True
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_habits_user_id_is_active', 'habits', ['user_id', 'is_active'],
+            unique=False, postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_habits_user_id_is_active_id', table_name='habits', postgresql_concurrently=True
+        )
@@ -0,0 +1,30 @@
+"""schedule_version
+
+Revision ID: e9c4a7b2d815
+Revises: d4b7a9e2c361
+Create Date: 2026-10-18 10:42:16.305871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# идентификаторы изменений
+revision = 'e9c4a7b2d815'
+down_revision = 'd4b7a9e2c361'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    schedule_version = op.create_table(
+        'schedule_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(schedule_version, [{'id': 1, 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('schedule_version')
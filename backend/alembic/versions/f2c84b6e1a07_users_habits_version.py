@@ -0,0 +1,27 @@
+"""users_habits_version
+
+Revision ID: f2c84b6e1a07
+Revises: e5a90c3b7d16
+Create Date: 2026-10-17 16:48:53.027741
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# идентификаторы изменений
+revision = 'f2c84b6e1a07'
+down_revision = 'e5a90c3b7d16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'users',
+        sa.Column('habits_version', sa.Integer(), server_default='0', nullable=False)
+    )
+
+
+def downgrade():
+    op.drop_column('users', 'habits_version')
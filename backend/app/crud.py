@@ -1,26 +1,169 @@
+import logging
+import time
+from sqlalchemy import and_, bindparam, case, delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from . import models
 from datetime import datetime, timedelta
 from .schemas import HabitCreate
+from .days import day_start
+from typing import Iterable, List
 
+logger = logging.getLogger(__name__)
 
-def create_habit(db: Session, habit: HabitCreate):
-    db_habit = models.Habit(**habit.dict())
+CARRY_OVER_CHUNK_SIZE = 10000
+
+
+def bump_habits_version(db: Session, *user_ids: int):
+    """Меняет версию списка привычек; вызывается в транзакции, которая пишет в habits"""
+    db.execute(
+        update(models.User)
+        .where(models.User.id.in_(user_ids))
+        .values(habits_version=models.User.habits_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def record_schedule_change(db: Session, *user_ids: int):
+    """Сигнал владельцу планировщика перечитать расписание этих пользователей;
+    вызывается в транзакции изменения"""
+    db.execute(insert(models.ScheduleChange), [
+        {"user_id": user_id, "created_at": datetime.utcnow()} for user_id in user_ids
+    ])
+
+
+def get_habits_version(db: Session, user_id: int):
+    return db.query(models.User.habits_version).filter(models.User.id == user_id).scalar()
+
+
+def create_habit(db: Session, user_id: int, habit: HabitCreate):
+    """Повтор имени у пользователя отсекает uq_habits_user_id_name — IntegrityError пробрасывается"""
+    db_habit = models.Habit(
+        user_id=user_id,
+        name=habit.name,
+        reminder_time=habit.reminder_time,
+        is_active=True
+    )
     db.add(db_habit)
-    db.commit()
-    db.refresh(db_habit)
+    bump_habits_version(db, user_id)
+    record_schedule_change(db, user_id)
+    try:
+        db.flush()
+        # после INSERT все поля уже в объекте: отвязанный от сессии, он не сбросится
+        # на commit и не потребует refresh
+        db.expunge(db_habit)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise
     return db_habit
 
 
+def create_user(db: Session, username: str, hashed_password: str):
+    db_user = models.User(username=username, hashed_password=hashed_password)
+    db.add(db_user)
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
+
 def update_user_telegram_id(db: Session, username: str, telegram_id: int):
     user = db.query(models.User).filter(models.User.username == username).first()
     if user:
         user.telegram_id = telegram_id
+        record_schedule_change(db, user.id)
         db.commit()
         db.refresh(user)
     return user
 
 
+def set_digest_times(db: Session, user_id: int, times: List[str]):
+    """Включает сводку (непустой times) или возвращает отдельные напоминания"""
+    value = ",".join(sorted(set(times))) or None
+    db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(digest_times=value)
+        .execution_options(synchronize_session=False)
+    )
+    # запись в журнале — сигнал владельцу расписания перечитать пользователя
+    record_schedule_change(db, user_id)
+    db.commit()
+    return value
+
+
+def get_digest_times(db: Session, user_id: int):
+    return db.query(models.User.digest_times).filter(models.User.id == user_id).scalar()
+
+
+def get_user_schedules(db: Session, user_ids: Iterable[int]) -> list:
+    """Всё, что нужно расписанию напоминаний о пользователях: (user_id, telegram_id, время
+    сводки, привычки (habit_id, reminder_time, name, is_active)). Выключенные привычки
+    тоже возвращаются — чтобы убрать их из расписания"""
+    user_ids = list(user_ids)
+    users = {
+        user_id: (telegram_id, digest_times)
+        for user_id, telegram_id, digest_times in db.execute(
+            select(models.User.id, models.User.telegram_id, models.User.digest_times)
+            .where(models.User.id.in_(user_ids))
+        )
+    }
+    habits = {user_id: [] for user_id in user_ids}
+    for user_id, *habit in db.execute(
+            select(models.Habit.user_id, models.Habit.id, models.Habit.reminder_time,
+                   models.Habit.name, models.Habit.is_active)
+            .where(models.Habit.user_id.in_(user_ids))
+    ):
+        habits[user_id].append(tuple(habit))
+    db.commit()
+    return [(user_id, *users.get(user_id, (None, None)), habits[user_id]) for user_id in user_ids]
+
+
+def get_user_schedule(db: Session, user_id: int):
+    return get_user_schedules(db, [user_id])[0]
+
+
+def get_changed_schedules(db: Session, since: datetime) -> list:
+    """Расписания пользователей, изменённые начиная с since (см. get_user_schedules)"""
+    user_ids = db.execute(
+        select(models.ScheduleChange.user_id).where(models.ScheduleChange.created_at >= since).distinct()
+    ).scalars().all()
+    if not user_ids:
+        db.commit()
+        return []
+    return get_user_schedules(db, user_ids)
+
+
+def purge_schedule_changes(db: Session, before: datetime) -> int:
+    deleted = db.execute(
+        delete(models.ScheduleChange)
+        .where(models.ScheduleChange.created_at < before)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return deleted
+
+
+def get_digest_habits(db: Session, user_ids: List[int], day_start: datetime, chunk_size: int = 10000):
+    """Невыполненные с day_start активные привычки пользователей сводки, один запрос на пачку:
+    {user_id: [(habit_id, name), ...]}"""
+    habits = {}
+    for first in range(0, len(user_ids), chunk_size):
+        rows = db.execute(
+            select(models.Habit.user_id, models.Habit.id, models.Habit.name)
+            .where(
+                models.Habit.user_id.in_(user_ids[first:first + chunk_size]),
+                models.Habit.is_active == True,
+                or_(models.Habit.last_completed.is_(None), models.Habit.last_completed < day_start)
+            )
+            .order_by(models.Habit.user_id, models.Habit.id)
+        )
+        for user_id, habit_id, name in rows:
+            habits.setdefault(user_id, []).append((habit_id, name))
+    db.commit()
+    return habits
+
+
 def get_user(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
 
@@ -33,55 +176,152 @@ def get_habit(db: Session, habit_id: int):
     return db.query(models.Habit).filter(models.Habit.id == habit_id).first()
 
 
-def get_habits(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Habit).filter(
+def get_habits(db: Session, user_id: int, after_id: int = None, limit: int = 100):
+    """Страница активных привычек по ключу id: диапазон по индексу (user_id, is_active, id) без OFFSET"""
+    query = db.query(models.Habit).filter(
         models.Habit.user_id == user_id,
         models.Habit.is_active == True
-    ).offset(skip).limit(limit).all()
+    )
+    if after_id is not None:
+        query = query.filter(models.Habit.id > after_id)
+    return query.order_by(models.Habit.id).limit(limit).all()
 
 
-def mark_habit_completed(db: Session, habit_id: int):
-    habit = db.query(models.Habit).filter(
-        models.Habit.id == habit_id,
-        models.Habit.is_active == True
-    ).first()
-    if not habit:
-        return None
-    if habit:
-        now = datetime.utcnow()
-        today = now.date()
-        last_completed = habit.last_completed.date() if habit.last_completed else None
-
-        if last_completed:
-            if last_completed == today - timedelta(days=1):
-                habit.streak += 1
-            elif last_completed != today:
-                habit.streak = 1
+def complete_habits(db: Session, user_id: int, habit_ids: List[int]):
+    """Отметка активных привычек пользователя одним UPDATE ... RETURNING.
+
+    Новые счётчики считает сама база из текущих значений строки, поэтому одновременные
+    отметки одной привычки не теряют друг друга. Чужие, выключенные и несуществующие
+    привычки просто не попадают в результат. Журнал и версия списка пишутся в той же транзакции.
+    """
+    now = datetime.utcnow()
+    # сутки — те же, что у напоминаний и сводки (REMINDER_TIMEZONE), а не календарные UTC
+    today, yesterday = day_start(), day_start(days_ago=1)
+    habit = models.Habit
+    rows = db.execute(
+        update(habit)
+        .where(habit.id.in_(habit_ids), habit.user_id == user_id, habit.is_active == True)
+        .values(
+            streak=case(
+                # уже отмечена сегодня: серия не меняется
+                (habit.last_completed >= today, func.coalesce(habit.streak, 0)),
+                (habit.last_completed >= yesterday, func.coalesce(habit.streak, 0) + 1),
+                else_=1
+            ),
+            completion_count=func.coalesce(habit.completion_count, 0) + 1,
+            last_completed=now
+        )
+        .returning(habit.id, habit.name, habit.completion_count, habit.streak)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if rows:
+        db.execute(insert(models.HabitCompletion), [{"habit_id": row.id, "completed_at": now} for row in rows])
+        bump_habits_version(db, user_id)
+    db.commit()
+    return rows
+
+
+def mark_habit_completed(db: Session, habit_id: int, user_id: int):
+    """Отметка одной привычки; None — привычки нет, она чужая или выключена"""
+    rows = complete_habits(db, user_id, [habit_id])
+    return rows[0] if rows else None
+
+
+def mark_habit_completed_with_list(db: Session, habit_id: int, user_id: int, limit: int = 100):
+    """Отметка и свежий список привычек пользователя за один заход в пул потоков"""
+    habit = mark_habit_completed(db, habit_id, user_id)
+    if habit is None:
+        return None, []
+    return habit, get_habits(db, user_id=user_id, limit=limit)
+
+
+def mark_habits_completed(db: Session, user_id: int, habit_ids: List[int]):
+    """Отметка нескольких привычек пользователя с результатом по каждой"""
+    habit_ids = list(dict.fromkeys(habit_ids))
+    completed = {row.id: row for row in complete_habits(db, user_id, habit_ids)}
+    # причины отказа нужны только для неотмеченных
+    missed = [habit_id for habit_id in habit_ids if habit_id not in completed]
+    habits = {
+        habit.id: habit
+        for habit in db.query(models.Habit).filter(models.Habit.id.in_(missed))
+    } if missed else {}
+    results = []
+    for habit_id in habit_ids:
+        row = completed.get(habit_id)
+        habit = habits.get(habit_id)
+        if row is not None:
+            results.append({
+                "habit_id": habit_id,
+                "status": "completed",
+                "name": row.name,
+                "completion_count": row.completion_count,
+                "streak": row.streak
+            })
+        elif habit is None:
+            results.append({"habit_id": habit_id, "status": "not_found"})
+        elif habit.user_id != user_id:
+            results.append({"habit_id": habit_id, "status": "forbidden"})
         else:
-            habit.streak = 1
+            results.append({"habit_id": habit_id, "status": "inactive"})
+    return results
 
-        habit.completion_count += 1
-        habit.last_completed = now
-        db.commit()
-    return habit
 
+def get_habit_completions(db: Session, habit_id: int, since: datetime = None, limit: int = 100):
+    """История отметок привычки, новые первыми; идёт по индексу (habit_id, completed_at)"""
+    query = db.query(models.HabitCompletion).filter(models.HabitCompletion.habit_id == habit_id)
+    if since is not None:
+        query = query.filter(models.HabitCompletion.completed_at >= since)
+    return query.order_by(models.HabitCompletion.completed_at.desc()).limit(limit).all()
 
-def carry_over_habits(db: Session):
-    yesterday = datetime.utcnow() - timedelta(days=1)
-    habits = db.query(models.Habit).filter(
-        models.Habit.last_completed < yesterday.date(),
-        models.Habit.completion_count < 21
-    ).all()
 
-    for habit in habits:
-        habit.streak = 0
+def carry_over_habits(db: Session, chunk_size: int = CARRY_OVER_CHUNK_SIZE):
+    """Сброс серий по диапазонам id: один UPDATE и короткая транзакция на диапазон"""
+    yesterday = day_start(days_ago=1)
+    max_id = db.query(func.max(models.Habit.id)).scalar() or 0
     db.commit()
 
+    chunks = []
+    for first_id in range(1, max_id + 1, chunk_size):
+        last_id = first_id + chunk_size - 1
+        started = time.perf_counter()
+        stale = (
+            models.Habit.id.between(first_id, last_id),
+            models.Habit.last_completed < yesterday,
+            models.Habit.completion_count < 21,
+            or_(models.Habit.streak != 0, models.Habit.streak.is_(None))
+        )
+        db.execute(
+            update(models.User)
+            .where(models.User.id.in_(select(models.Habit.user_id).where(*stale)))
+            .values(habits_version=models.User.habits_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        result = db.execute(
+            update(models.Habit)
+            .where(*stale)
+            .values(streak=0)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        chunk = {
+            "first_id": first_id,
+            "last_id": last_id,
+            "rows": result.rowcount,
+            "seconds": round(time.perf_counter() - started, 4)
+        }
+        chunks.append(chunk)
+        logger.info(
+            "Перенос привычек: id %d–%d, строк %d, %.3f с",
+            first_id, last_id, chunk["rows"], chunk["seconds"]
+        )
+    return chunks
+
 
 def update_habit(
         db: Session,
         habit_id: int,
         name: str = None,
+        reminder_time: str = None,
         is_active: bool = None
 ):
     habit = db.query(models.Habit).filter(models.Habit.id == habit_id).first()
@@ -90,24 +330,214 @@ def update_habit(
 
     if name:
         habit.name = name
+    if reminder_time:
+        habit.reminder_time = reminder_time
     if is_active is not None:
         habit.is_active = is_active
+    bump_habits_version(db, habit.user_id)
+    record_schedule_change(db, habit.user_id)
 
-    db.commit()
-    db.refresh(habit)
+    try:
+        db.flush()
+        db.expunge(habit)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise
     return habit
 
 
 
-def delete_habit(db: Session, habit_id: int):
-    habit = db.query(models.Habit).filter(models.Habit.id == habit_id).first()
-    if not habit:
+def delete_habit(db: Session, habit_id: int, user_id: int):
+    """Удаляет привычку владельца вместе с журналом; False — привычки нет или она чужая"""
+    owned = select(models.Habit.id).where(models.Habit.id == habit_id, models.Habit.user_id == user_id)
+    db.execute(
+        delete(models.HabitCompletion)
+        .where(models.HabitCompletion.habit_id.in_(owned))
+        .execution_options(synchronize_session=False)
+    )
+    deleted = db.execute(
+        delete(models.Habit)
+        .where(models.Habit.id == habit_id, models.Habit.user_id == user_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not deleted:
+        db.rollback()
         return False
-
-    db.delete(habit)
+    bump_habits_version(db, user_id)
+    record_schedule_change(db, user_id)
     db.commit()
     return True
 
 
 def get_user_by_username(db: Session, username: str):
-    return db.query(models.User).filter(models.User.username == username).first()
\ No newline at end of file
+    return db.query(models.User).filter(models.User.username == username).first()
+
+def acquire_lease(db: Session, name: str, owner: str, ttl: float) -> bool:
+    """Продлевает свою аренду или забирает истёкшую; True — процесс владеет арендой"""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl)
+    result = db.execute(
+        update(models.SchedulerLease)
+        .where(
+            models.SchedulerLease.name == name,
+            or_(models.SchedulerLease.owner == owner, models.SchedulerLease.expires_at < now)
+        )
+        .values(owner=owner, expires_at=expires_at)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        db.commit()
+        return True
+    db.add(models.SchedulerLease(name=name, owner=owner, expires_at=expires_at))
+    try:
+        db.commit()
+    except IntegrityError:
+        # аренда есть и ещё действует у другого процесса
+        db.rollback()
+        return False
+    return True
+
+
+def release_lease(db: Session, name: str, owner: str):
+    """Отдать аренду сразу, не дожидаясь истечения срока"""
+    db.execute(
+        update(models.SchedulerLease)
+        .where(models.SchedulerLease.name == name, models.SchedulerLease.owner == owner)
+        .values(expires_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def get_lease_last_run(db: Session, name: str):
+    return db.query(models.SchedulerLease.last_run).filter(models.SchedulerLease.name == name).scalar()
+
+
+def record_lease_run(db: Session, name: str, owner: str, last_run: datetime) -> bool:
+    """Запоминает отработанную минуту, пока аренда за этим процессом"""
+    result = db.execute(
+        update(models.SchedulerLease)
+        .where(models.SchedulerLease.name == name, models.SchedulerLease.owner == owner)
+        .values(last_run=last_run)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return bool(result.rowcount)
+
+
+def get_suppressed_reminders(db: Session, habit_ids: List[int], day_start: datetime, chunk_size: int = 10000):
+    """Какие из напоминаний минуты не нужны: {habit_id: причина}.
+
+    Один SELECT по первичному ключу на пачку: привычка выключена или удалена
+    из другого процесса ("inactive"), либо уже отмечена после day_start ("completed").
+    """
+    suppressed = {}
+    for first in range(0, len(habit_ids), chunk_size):
+        chunk = habit_ids[first:first + chunk_size]
+        found = set()
+        rows = db.execute(
+            select(models.Habit.id, models.Habit.is_active, models.Habit.last_completed)
+            .where(models.Habit.id.in_(chunk))
+        )
+        for habit_id, is_active, last_completed in rows:
+            found.add(habit_id)
+            if not is_active:
+                suppressed[habit_id] = "inactive"
+            elif last_completed is not None and last_completed >= day_start:
+                suppressed[habit_id] = "completed"
+        for habit_id in chunk:
+            if habit_id not in found:
+                suppressed[habit_id] = "inactive"
+    db.commit()
+    return suppressed
+
+
+def add_outbox_messages(db: Session, messages: List[dict]):
+    """Постановка сообщений в outbox одним INSERT; строки с уже известным dedup_key пропускаются"""
+    if not messages:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        dialect_insert = None
+    if dialect_insert is not None:
+        statement = dialect_insert(models.ReminderOutbox).on_conflict_do_nothing(index_elements=["dedup_key"])
+    else:
+        statement = insert(models.ReminderOutbox)
+    db.execute(statement, messages)
+    db.commit()
+
+
+def claim_outbox_batch(db: Session, limit: int, claim_seconds: float, token: str):
+    """Забирает до limit готовых к отправке сообщений одним UPDATE ... RETURNING.
+
+    На Postgres строки выбираются с FOR UPDATE SKIP LOCKED, и воркеры разных процессов
+    не ждут друг друга; SQLite выполняет запись целиком под блокировкой базы, что даёт
+    то же самое. Сообщения воркера, не успевшего отчитаться до locked_until, забирает следующий.
+    """
+    outbox = models.ReminderOutbox
+    now = datetime.utcnow()
+    ready = (
+        select(outbox.id)
+        .where(or_(
+            and_(outbox.status == "pending", outbox.available_at <= now),
+            and_(outbox.status == "sending", outbox.locked_until < now)
+        ))
+        .order_by(outbox.available_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    rows = db.execute(
+        update(outbox)
+        .where(outbox.id.in_(ready))
+        .values(
+            status="sending",
+            locked_until=now + timedelta(seconds=claim_seconds),
+            claim_token=token,
+            attempts=outbox.attempts + 1
+        )
+        .returning(
+            outbox.id, outbox.chat_id, outbox.text, outbox.reply_markup, outbox.attempts, outbox.created_at
+        )
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return rows
+
+
+def finish_outbox_batch(db: Session, token: str, results: List[dict]):
+    """Итог пачки одним executemany: _id, status, attempts, available_at, sent_at, last_error.
+
+    Строки, которые после истечения locked_until забрал другой воркер, не трогаются.
+    """
+    outbox = models.ReminderOutbox.__table__
+    if results:
+        db.execute(
+            update(outbox)
+            .where(outbox.c.id == bindparam("_id"), outbox.c.claim_token == token)
+            .values(
+                status=bindparam("status"),
+                attempts=bindparam("attempts"),
+                available_at=bindparam("available_at"),
+                sent_at=bindparam("sent_at"),
+                last_error=bindparam("last_error")
+            ),
+            results
+        )
+    db.commit()
+
+
+def purge_outbox(db: Session, before: datetime) -> int:
+    """Удаляет доставленные и окончательно неудавшиеся сообщения старше before"""
+    outbox = models.ReminderOutbox
+    result = db.execute(
+        delete(outbox)
+        .where(outbox.status.in_(("sent", "failed")), outbox.created_at < before)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
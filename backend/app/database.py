@@ -1,21 +1,119 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
 from alembic import command
 from alembic.config import Config
 
+from .metrics import DB_POOL_WAIT, pool_collector, track_queries
+
 def upgrade_db():
     alembic_cfg = Config("alembic.ini")
     command.upgrade(alembic_cfg, "head")
 
-SQLALCHEMY_DATABASE_URL = "postgresql://habit_user:habit_pass@db:5432/habit_db"
+SQLALCHEMY_DATABASE_URL = os.getenv(
+    "DATABASE_URL", "postgresql://habit_user:habit_pass@db:5432/habit_db"
+)
+# sync — эндпоинты ходят в БД через пул потоков, async — через asyncpg в event loop
+DB_MODE = os.getenv("DB_MODE", "sync")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "0"))
+
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS[parsed.get_backend_name()]).render_as_string(
+        hide_password=False
+    )
+
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     pool_pre_ping=True,
-    pool_size=20,
-    max_overflow=0
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+pool_collector.add("sync", engine)
+track_queries(engine)
+
+async_engine = None
+AsyncSessionLocal = None
+if DB_MODE == "async":
+    async_engine = create_async_engine(
+        os.getenv("ASYNC_DATABASE_URL", to_async_url(SQLALCHEMY_DATABASE_URL)),
+        pool_pre_ping=True,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW
+    )
+    # объекты читаются после commit вне greenlet, поэтому не даём им протухать
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+    pool_collector.add("async", async_engine)
+    track_queries(async_engine.sync_engine)
+
+Base = declarative_base()
+
+
+# сессия держит соединение между переходами в пул потоков: не выдаём больше
+# сессий, чем соединений в пуле, иначе потоки ждут соединений, а соединения — потоков
+db_slots = asyncio.Semaphore(DB_POOL_SIZE + DB_MAX_OVERFLOW)
+
+
+@asynccontextmanager
+async def open_db():
+    """Сессия текущего режима БД; для коротких обращений внутри эндпоинта"""
+    started = time.perf_counter()
+    if DB_MODE == "async":
+        async with AsyncSessionLocal() as db:
+            # соединение берётся сразу, чтобы время ожидания пула попало в метрику
+            await db.connection()
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+            yield db
+        return
+    # слотов столько же, сколько соединений, так что ждут здесь, а не в пуле
+    async with db_slots:
+        DB_POOL_WAIT.observe(time.perf_counter() - started)
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+
+
+async def get_db():
+    async with open_db() as db:
+        yield db
+
+
+async def run_db(db, fn, *args, **kwargs):
+    """Вызов синхронной функции crud из async-эндпоинта в текущем режиме БД"""
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+async def with_db(fn, *args, **kwargs):
+    """Короткая сессия для фоновой задачи, в общем лимите соединений с эндпоинтами"""
+    async with open_db() as db:
+        return await run_db(db, fn, *args, **kwargs)
+
+
+async def with_sync_db(fn, *args, **kwargs):
+    """Синхронная сессия в пуле потоков при любом DB_MODE — для тяжёлой обработки строк,
+    которая в режиме async иначе шла бы в event loop через run_sync"""
+    def call():
+        with SessionLocal() as db:
+            return fn(db, *args, **kwargs)
 
-Base = declarative_base()
\ No newline at end of file
+    async with db_slots:
+        return await run_in_threadpool(call)
@@ -0,0 +1,23 @@
+"""Границы суток для серий, переноса, сводок и напоминаний: сутки REMINDER_TIMEZONE, а не UTC.
+
+Модуль без зависимостей от БД: его импортирует и пересчёт статистики до создания движка.
+"""
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+REMINDER_TIMEZONE = ZoneInfo(os.getenv("REMINDER_TIMEZONE", "Europe/Moscow"))
+
+
+def day_start(now: Optional[datetime] = None, days_ago: int = 0, tz: ZoneInfo = REMINDER_TIMEZONE) -> datetime:
+    """Начало суток tz (по умолчанию REMINDER_TIMEZONE) в UTC без tzinfo, как хранятся
+    last_completed и completed_at. Одна граница суток для серий, переноса и напоминаний"""
+    local = (now or datetime.now(timezone.utc)).astimezone(tz)
+    midnight = datetime.combine(local.date() - timedelta(days=days_ago), time(), tzinfo=tz)
+    return midnight.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def local_date(moment: datetime, tz: ZoneInfo = REMINDER_TIMEZONE) -> date:
+    """Сутки tz, к которым относится момент в UTC без tzinfo"""
+    return moment.replace(tzinfo=timezone.utc).astimezone(tz).date()
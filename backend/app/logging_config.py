@@ -0,0 +1,122 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Tuple
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# уровни отдельных логгеров: "apscheduler=WARNING,uvicorn.access=WARNING"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "apscheduler=WARNING")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# одинаковых предупреждений и ошибок не больше LOG_RATE_LIMIT за LOG_RATE_WINDOW секунд
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "10"))
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "60"))
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# логгеры uvicorn настраиваются до импорта приложения, их обработчики тоже уводим в очередь
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+_listeners: List[QueueListener] = []
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Кладёт записи в ограниченную очередь; при переполнении запись теряется, а поток не ждёт"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RateLimitFilter(logging.Filter):
+    """Пропускает не больше limit записей одного шаблона за window секунд.
+
+    Ключ — логгер, уровень и шаблон сообщения без аргументов, поэтому ошибки отправки
+    разным пользователям считаются одной. Число подавленных дописывается к первой
+    записи следующего окна.
+    """
+
+    def __init__(self, limit: int = LOG_RATE_LIMIT, window: float = LOG_RATE_WINDOW, level: int = logging.WARNING):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self.level = level
+        self._windows: Dict[Tuple[str, int, str], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.level or self.limit <= 0:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            # [начало окна, пропущено, подавлено]
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} (ещё {suppressed} таких записей подавлено)"
+                return True
+            if state[1] < self.limit:
+                state[1] += 1
+                return True
+            state[2] += 1
+            return False
+
+
+def _queue_handler() -> DroppingQueueHandler:
+    handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(RateLimitFilter())
+    return handler
+
+
+def _route_through_queue(logger: logging.Logger, handlers: List[logging.Handler]):
+    queue_handler = _queue_handler()
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+    logger.handlers = [queue_handler]
+
+
+def parse_levels(value: str) -> Dict[str, str]:
+    levels = {}
+    for part in value.split(","):
+        name, _, level = part.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    """Вывод логов в отдельном потоке: обработчики запросов только кладут запись в очередь"""
+    if _listeners:
+        return
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+    _route_through_queue(root, [stream])
+
+    for name in UVICORN_LOGGERS:
+        logger = logging.getLogger(name)
+        if logger.handlers:
+            _route_through_queue(logger, list(logger.handlers))
+
+    for name, level in parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Дописать оставшиеся в очереди записи"""
+    while _listeners:
+        _listeners.pop().stop()
@@ -1,40 +1,56 @@
 import os
 import logging
-from datetime import datetime, timedelta
-from typing import List
-from fastapi import FastAPI, Depends, HTTPException, Body, Query
+import uuid
+from datetime import timedelta
+from typing import List, Optional
+from fastapi import FastAPI, Depends, HTTPException, Body, Query, Request, Response
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.interval import IntervalTrigger
-from .database import SessionLocal, engine
+from .logging_config import setup_logging
+from .database import async_engine, engine, get_db, open_db, run_db
 from . import models, crud
 from dotenv import load_dotenv
-from .schemas import HabitCreate, HabitResponse, UserCreate, UserResponse, HabitUpdate
+from .schemas import (
+    HabitCreate, HabitResponse, UserCreate, UserResponse, HabitUpdate, HabitCompletionResponse,
+    HabitBulkComplete, HabitCompletionResult, DigestSettings, DigestResponse
+)
+from .services.outbox import OUTBOX_WORKERS, OutboxDispatcher, OutboxMessage
+from .services.reminders import DueReminder, ReminderEngine
+from .services.scheduler import LeaderScheduler
+from .services.telegram_sender import TelegramSender
+from .services.user_cache import UserCache, UserIdentity
+from .metrics import CACHE_ENTRIES, REMINDER_DIGESTS, REMINDERS_SCHEDULED, MetricsMiddleware, render as render_metrics
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+from .security import (
+    ACCESS_TOKEN_EXPIRE_MINUTES, create_access_token, get_password_hash, token_cache, verify_password
+)
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from jose import JWTError
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger("apscheduler")
-logger.setLevel(logging.DEBUG)
+setup_logging()
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+# больше кнопок в одной сводке Telegram показывает неудобно
+DIGEST_MAX_HABITS = int(os.getenv("DIGEST_MAX_HABITS", "20"))
+# число и время запросов к БД в заголовках ответа; только для отладки
+DB_QUERY_HEADERS = os.getenv("DB_QUERY_HEADERS", "0") == "1"
 
 app = FastAPI(redirect_slashes=False)
-scheduler = AsyncIOScheduler()
+# одновременных отправок не больше, чем воркеров outbox
+sender = TelegramSender(TOKEN, pool_size=max(OUTBOX_WORKERS, 1))
+user_cache = UserCache()
+CACHE_ENTRIES.labels("users").set_function(lambda: len(user_cache))
+CACHE_ENTRIES.labels("tokens").set_function(lambda: len(token_cache))
+app.add_middleware(MetricsMiddleware, query_headers=DB_QUERY_HEADERS)
 
 
 models.Base.metadata.create_all(bind=engine)
 
 
-SECRET_KEY = os.getenv("SECRET_KEY", "secret")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
@@ -47,50 +63,34 @@ class TokenData(BaseModel):
     username: str | None = None
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def get_user_identity(db, telegram_id: int) -> UserIdentity | None:
+    identity = user_cache.get(telegram_id)
+    if identity is None:
+        user = await run_db(db, crud.get_user_by_telegram_id, telegram_id=telegram_id)
+        if user is None:
+            return None
+        identity = user_cache.put(user)
+    return identity
 
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
-
-def authenticate_user(db: Session, username: str, password: str):
-    user = crud.get_user_by_username(db, username=username)
+async def authenticate_user(username: str, password: str):
+    # сессия закрывается до проверки пароля, чтобы bcrypt не держал соединение с БД
+    async with open_db() as db:
+        user = await run_db(db, crud.get_user_by_username, username=username)
     if not user:
-        logger.error(f"User {username} not found in DB")
+        logger.warning("User %s not found in DB", username)
         return False
-    if not verify_password(password, user.hashed_password):
-        logger.error(f"Invalid password for user {username}")
+    if not await verify_password(password, user.hashed_password):
+        logger.warning("Invalid password for user %s", username)
         return False
     return user
 
 
-def create_access_token(data: dict, expires_delta: timedelta | None = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
-
 @app.post("/token", response_model=Token)
 async def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    form_data: OAuth2PasswordRequestForm = Depends()
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=401,
@@ -115,115 +115,166 @@ async def read_users_me(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = token_cache.decode(token)
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = crud.get_user_by_username(db, username=token_data.username)
+    user = await run_db(db, crud.get_user_by_username, username=token_data.username)
     if user is None:
         raise credentials_exception
     return user
 
 
+def reminder_text(habit_name: str) -> str:
+    return f"⏰ Не забудьте выполнить привычку: '{habit_name}'!"
+
+
 async def send_reminder(user_id: int, habit_name: str):
-    try:
-        from telegram import Bot
-        bot = Bot(token=TOKEN)
-        await bot.send_message(
-            chat_id=user_id,
-            text=f"⏰ Не забудьте выполнить привычку: '{habit_name}'!"
+    """Проверочное напоминание идёт тем же путём, что и плановые, но без дедупликации"""
+    await outbox.add([OutboxMessage(f"test:{user_id}:{uuid.uuid4().hex}", user_id, reminder_text(habit_name))])
+
+
+async def send_reminders(due: List[DueReminder]):
+    """Напоминания минуты одной вставкой в outbox; доставляют воркеры OutboxDispatcher"""
+    await outbox.add([
+        OutboxMessage(
+            f"habit:{reminder.habit_id}:{reminder.minute:%Y-%m-%dT%H:%M}",
+            reminder.telegram_id, reminder_text(reminder.habit_name)
         )
-        logger.info(f"Сообщение отправлено: user_id={user_id}, habit={habit_name}")
-    except Exception as e:
-        logger.error(f"Ошибка отправки: {str(e)}", exc_info=True)
+        for reminder in due
+    ])
+
+
+async def suppressed_reminders(habit_ids: List[int], day_start):
+    async with open_db() as db:
+        return await run_db(db, crud.get_suppressed_reminders, habit_ids=habit_ids, day_start=day_start)
+
+
+def digest_message(habits: List[tuple]) -> tuple:
+    """Текст сводки и кнопки «выполнено» — те же done_<id>, что у команды /done"""
+    shown = habits[:DIGEST_MAX_HABITS]
+    lines = [f"{i + 1}. {name}" for i, (_, name) in enumerate(shown)]
+    if len(habits) > len(shown):
+        lines.append(f"…и ещё {len(habits) - len(shown)}")
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton(f"✅ {name}", callback_data=f"done_{habit_id}")] for habit_id, name in shown
+    ])
+    return "⏰ Привычки на сегодня:\n\n" + "\n".join(lines), keyboard
+
+
+async def send_digests(users: dict, day_start) -> int:
+    """Одна сводка на пользователя вместо напоминания на каждую привычку"""
+    async with open_db() as db:
+        habits = await run_db(db, crud.get_digest_habits, user_ids=list(users), day_start=day_start)
+    messages = []
+    for user_id, (telegram_id, minute) in users.items():
+        if not habits.get(user_id):
+            REMINDER_DIGESTS.labels("empty").inc()
+            continue
+        text, keyboard = digest_message(habits[user_id])
+        messages.append(OutboxMessage(f"digest:{user_id}:{minute:%Y-%m-%dT%H:%M}", telegram_id, text, keyboard))
+    if messages:
+        await outbox.add(messages)
+    REMINDER_DIGESTS.labels("sent").inc(len(messages))
+    return len(messages)
+
+
+outbox = OutboxDispatcher(sender)
+reminders = ReminderEngine(send_reminders, suppress=suppressed_reminders, digest=send_digests)
+scheduler = LeaderScheduler(reminders, outbox)
+# колесо вне аренды может быть устаревшим: полное расписание показывает только владелец
+REMINDERS_SCHEDULED.set_function(lambda: len(reminders.wheel) if scheduler.holds_lease else 0)
 
 
 @app.on_event("startup")
-def init_scheduler():
+async def start_background():
+    await sender.start()
+    # outbox разбирают все процессы, а напоминания в него пишет только владелец аренды
+    outbox.start()
     scheduler.start()
-    logger.info(f"Планировщик запущен: {scheduler.running}")
-    logger.info(f"Активные задачи: {scheduler.get_jobs()}")
+
+
+@app.on_event("shutdown")
+async def stop_background():
+    await scheduler.stop()
+    await outbox.stop()
+    await sender.stop()
+    if async_engine is not None:
+        await async_engine.dispose()
 
 
 @app.post("/users/", response_model=UserResponse)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_username(db, username=user.username)
+async def create_user(user: UserCreate):
+    async with open_db() as db:
+        db_user = await run_db(db, crud.get_user_by_username, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    hashed_password = get_password_hash(user.password)
-    db_user = models.User(
-        username=user.username,
-        hashed_password=hashed_password
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    hashed_password = await get_password_hash(user.password)
+    async with open_db() as db:
+        return await run_db(db, crud.create_user, username=user.username, hashed_password=hashed_password)
 
 
 from datetime import datetime
 from fastapi import HTTPException, status
-from apscheduler.triggers.interval import IntervalTrigger
 
 
 @app.put("/users/{username}/link_telegram")
-def link_telegram(
+async def link_telegram(
         username: str,
         data: dict = Body(...),
         db: Session = Depends(get_db),
         token: str = Depends(oauth2_scheme)
 ):
-    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    try:
+        payload = token_cache.decode(token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
     if payload.get("sub") != username:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    user = crud.update_user_telegram_id(db, username=username, telegram_id=data["telegram_id"])
+    user = await run_db(db, crud.update_user_telegram_id, username=username, telegram_id=data["telegram_id"])
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    user_cache.invalidate_user(user.id)
+    user_cache.invalidate(data["telegram_id"])
     return user
 
+@app.get("/users/digest", response_model=DigestResponse)
+async def read_digest(telegram_id: int, db: Session = Depends(get_db)):
+    user = await get_user_identity(db, telegram_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    times = await run_db(db, crud.get_digest_times, user_id=user.id)
+    return {"times": times.split(",") if times else []}
+
+
+@app.put("/users/digest", response_model=DigestResponse)
+async def update_digest(data: DigestSettings, db: Session = Depends(get_db)):
+    """Непустой times включает сводку в эти минуты вместо отдельных напоминаний"""
+    user = await get_user_identity(db, data.telegram_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    times = [f"{int(hours):02d}:{minutes}" for hours, minutes in (t.split(":") for t in data.times)]
+    value = await run_db(db, crud.set_digest_times, user_id=user.id, times=times)
+    # здесь расписание обновляется сразу, у владельца аренды — при ближайшей сверке
+    reminders.load_user(*await run_db(db, crud.get_user_schedule, user_id=user.id))
+    return {"times": value.split(",") if value else []}
+
+
 @app.post("/habits/", response_model=HabitResponse, status_code=status.HTTP_201_CREATED)
-def create_habit(habit: HabitCreate, db: Session = Depends(get_db)):
+async def create_habit(habit: HabitCreate, db: Session = Depends(get_db)):
     try:
-        db_user = crud.get_user_by_telegram_id(db, telegram_id=habit.telegram_id)
+        db_user = await get_user_identity(db, habit.telegram_id)
         if not db_user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        existing_habit = (
-            db.query(models.Habit)
-            .filter(
-                models.Habit.user_id == db_user.id,
-                models.Habit.name == habit.name
-            )
-            .first()
-        )
-        if existing_habit:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Habit with this name already exists"
-            )
+        db_habit = await run_db(db, crud.create_habit, user_id=db_user.id, habit=habit)
 
-        job = scheduler.add_job(
-            send_reminder,
-            trigger=IntervalTrigger(hours=1),
-            args=[db_user.telegram_id, habit.name],
-            id=f"habit_{db_user.id}_{habit.name}"
-        )
-        logger.info(f"Добавлена задача: ID={job.id}, Интервал={job.trigger}")
-
-        db_habit = models.Habit(
-            user_id=db_user.id,
-            name=habit.name,
-            is_active=True,
-            job_id=job.id
-        )
-
-        db.add(db_habit)
-        db.commit()
-        db.refresh(db_habit)
+        reminders.schedule(db_habit.id, db_habit.reminder_time, db_user.telegram_id, db_habit.name)
+        logger.debug("Добавлено напоминание: habit_id=%s, время=%s", db_habit.id, db_habit.reminder_time)
 
         return {
             **db_habit.__dict__,
@@ -233,9 +284,12 @@ def create_habit(habit: HabitCreate, db: Session = Depends(get_db)):
 
     except HTTPException:
         raise
+    except IntegrityError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Habit with this name already exists"
+        )
     except Exception as e:
-        if 'job' in locals():
-            scheduler.remove_job(job.id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating habit: {str(e)}"
@@ -243,80 +297,155 @@ def create_habit(habit: HabitCreate, db: Session = Depends(get_db)):
 
 
 @app.get("/habits/", response_model=List[HabitResponse])
-def read_habits(telegram_id: int, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_telegram_id(db, telegram_id=telegram_id)
+async def read_habits(
+        telegram_id: int,
+        request: Request,
+        response: Response,
+        cursor: Optional[str] = None,
+        limit: int = Query(100, ge=1, le=100),
+        db: Session = Depends(get_db)
+):
+    """Курсор следующей страницы возвращается в заголовке X-Next-Cursor.
+
+    ETag — версия списка пользователя: пока привычки не менялись, If-None-Match даёт 304
+    без чтения и сериализации списка.
+    """
+    try:
+        after_id = decode_cursor(cursor) if cursor else None
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    db_user = await get_user_identity(db, telegram_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
-    return crud.get_habits(db, user_id=db_user.id, skip=skip, limit=limit)
+
+    # версия читается до списка: запись между ними даст более новый список со старым ETag,
+    # и следующий запрос просто скачает его заново
+    version = await run_db(db, crud.get_habits_version, user_id=db_user.id)
+    etag = f'W/"{db_user.id}.{version}"'
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    # лишняя строка показывает, есть ли следующая страница, без отдельного COUNT
+    habits = await run_db(db, crud.get_habits, user_id=db_user.id, after_id=after_id, limit=limit + 1)
+    if len(habits) > limit:
+        habits = habits[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(habits[-1].id)
+    return habits
+
+
+@app.post("/habits/complete")
+async def complete_habits(data: HabitBulkComplete, db: Session = Depends(get_db)):
+    user = await get_user_identity(db, data.telegram_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    results = await run_db(db, crud.mark_habits_completed, user_id=user.id, habit_ids=data.habit_ids)
+    return {"status": "success", "results": [HabitCompletionResult(**result) for result in results]}
 
 
 @app.post("/habits/{habit_id}/complete")
-def complete_habit(
+async def complete_habit(
         habit_id: int,
         data: dict,
+        include_habits: bool = False,
         db: Session = Depends(get_db)
 ):
+    """С include_habits=true в ответ добавляется обновлённый список привычек пользователя"""
     if not data or "telegram_id" not in data:
         raise HTTPException(status_code=422, detail="telegram_id is required")
 
-    habit = crud.get_habit(db, habit_id=habit_id)
-    if not habit:
+    # владелец проверяется в том же UPDATE, что и отметка; причина отказа ищется только при отказе
+    user = await get_user_identity(db, data["telegram_id"])
+    completed_habit = None
+    if user:
+        if include_habits:
+            completed_habit, habits = await run_db(
+                db, crud.mark_habit_completed_with_list, habit_id=habit_id, user_id=user.id
+            )
+        else:
+            completed_habit = await run_db(db, crud.mark_habit_completed, habit_id=habit_id, user_id=user.id)
+    if not completed_habit:
+        habit = await run_db(db, crud.get_habit, habit_id=habit_id)
+        if not habit:
+            raise HTTPException(status_code=404, detail="Habit not found")
+        if not user or habit.user_id != user.id:
+            raise HTTPException(status_code=403, detail="Not your habit")
         raise HTTPException(status_code=404, detail="Habit not found")
 
-    user = crud.get_user_by_telegram_id(db, telegram_id=data["telegram_id"])
-    if not user or habit.user_id != user.id:
+    result = {"status": "success", "completion_count": completed_habit.completion_count}
+    if include_habits:
+        result["habits"] = [HabitResponse.model_validate(habit) for habit in habits]
+    return result
+
+
+@app.get("/habits/{habit_id}/completions", response_model=List[HabitCompletionResponse])
+async def read_habit_completions(
+        habit_id: int,
+        telegram_id: int,
+        days: int = Query(30, ge=1, le=366),
+        limit: int = Query(100, ge=1, le=1000),
+        db: Session = Depends(get_db)
+):
+    user = await get_user_identity(db, telegram_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    habit = await run_db(db, crud.get_habit, habit_id=habit_id)
+    if not habit or habit.user_id != user.id:
         raise HTTPException(status_code=403, detail="Not your habit")
 
-    completed_habit = crud.mark_habit_completed(db, habit_id=habit_id)
-    return {"status": "success", "completion_count": completed_habit.completion_count}
+    since = datetime.utcnow() - timedelta(days=days)
+    return await run_db(db, crud.get_habit_completions, habit_id=habit_id, since=since, limit=limit)
 
 
 @app.put("/habits/{habit_id}", response_model=HabitResponse)
-def update_habit(
+async def update_habit(
         habit_id: int,
         habit_update: HabitUpdate,
         db: Session = Depends(get_db)
 ):
-    habit = crud.get_habit(db, habit_id=habit_id)
+    try:
+        habit = await run_db(db, crud.update_habit, habit_id=habit_id, **habit_update.dict())
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="Habit with this name already exists")
     if not habit:
         raise HTTPException(status_code=404, detail="Habit not found")
 
-    if habit_update.is_active is False and habit.job_id:
-        try:
-            scheduler.remove_job(habit.job_id)
-        except Exception as e:
-            logger.warning(f"Ошибка удаления задачи: {e}")
-
-    return crud.update_habit(db, habit_id=habit_id, **habit_update.dict())
+    if habit.is_active:
+        user = await run_db(db, crud.get_user, user_id=habit.user_id)
+        reminders.schedule(habit.id, habit.reminder_time, user.telegram_id if user else None, habit.name)
+    else:
+        reminders.unschedule(habit.id)
+    return habit
 
 
 @app.delete("/habits/{habit_id}")
-def delete_habit(
+async def delete_habit(
     habit_id: int,
     telegram_id: int = Query(..., alias="telegram_id"),
     db: Session = Depends(get_db)
 ):
-    user = crud.get_user_by_telegram_id(db, telegram_id=telegram_id)
+    user = await get_user_identity(db, telegram_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    habit = crud.get_habit(db, habit_id=habit_id)
-    if not habit or habit.user_id != user.id:
+    # владелец проверяется в самих DELETE, без отдельного чтения привычки
+    if not await run_db(db, crud.delete_habit, habit_id=habit_id, user_id=user.id):
         raise HTTPException(status_code=403, detail="Not your habit")
 
-    if habit.job_id:
-        try:
-            scheduler.remove_job(habit.job_id)
-        except Exception as e:
-            logger.warning(f"Failed to delete job {habit.job_id}: {str(e)}")
-
-    success = crud.delete_habit(db, habit_id=habit_id)
-    if not success:
-        raise HTTPException(status_code=404, detail="Habit not found")
+    reminders.unschedule(habit_id)
     return {"status": "success"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @app.post("/test_reminder/{user_id}/{habit_name}")
-def trigger_reminder(user_id: int, habit_name: str):
-    send_reminder(user_id, habit_name)
+async def trigger_reminder(user_id: int, habit_name: str):
+    await send_reminder(user_id, habit_name)
     return {"status": "reminder_triggered"}
\ No newline at end of file
@@ -0,0 +1,168 @@
+import time
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import REGISTRY, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+# границы для запросов к API и ожидания соединения: от миллисекунды до десятка секунд
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# опоздание напоминаний считается секундами и минутами
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 7, 10, 15, 25, 50, 100)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "Запросы к API", ["method", "route", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Время обработки запроса", ["method", "route"],
+    buckets=LATENCY_BUCKETS
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Ожидание соединения с БД перед запросом", buckets=LATENCY_BUCKETS
+)
+DB_QUERIES = Histogram(
+    "db_queries_per_request", "Запросов к БД за один запрос к API", ["method", "route"],
+    buckets=QUERY_COUNT_BUCKETS
+)
+DB_QUERY_TIME = Histogram(
+    "db_query_seconds_per_request", "Суммарное время запросов к БД за один запрос к API", ["method", "route"],
+    buckets=LATENCY_BUCKETS
+)
+REMINDERS_SCHEDULED = Gauge("reminders_scheduled", "Привычек с напоминанием в расписании; у не владельца аренды 0")
+REMINDER_DISPATCH_LAG = Histogram(
+    "reminder_dispatch_lag_seconds", "Опоздание отправки напоминаний относительно их минуты",
+    buckets=LAG_BUCKETS
+)
+REMINDERS_SUPPRESSED = Counter(
+    "reminders_suppressed_total", "Напоминания, не отправленные при рассылке минуты", ["reason"]
+)
+REMINDER_DIGESTS = Counter(
+    "reminder_digests_total", "Сводки привычек: отправленные и пустые (всё уже выполнено)", ["result"]
+)
+OUTBOX_MESSAGES = Counter(
+    "outbox_messages_total", "Попытки доставки из outbox: sent, retry, failed", ["result"]
+)
+OUTBOX_DELIVERY_LAG = Histogram(
+    "outbox_delivery_lag_seconds", "От постановки в outbox до доставки", buckets=LAG_BUCKETS
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Обращения к кэшам процесса: users, tokens; hit или miss", ["cache", "result"]
+)
+CACHE_ENTRIES = Gauge("cache_entries", "Записей в кэше процесса", ["cache"])
+TELEGRAM_MESSAGES = Counter(
+    "telegram_messages_total", "Сообщения, отправленные в Telegram", ["result"]
+)
+SCHEDULER_LEADER = Gauge("scheduler_leader", "1, если этот процесс владеет арендой планировщика")
+
+
+class PoolCollector(Collector):
+    """Состояние пулов соединений SQLAlchemy на момент опроса /metrics"""
+
+    def __init__(self):
+        self.engines = {}
+
+    def add(self, name: str, engine):
+        self.engines[name] = engine
+
+    def collect(self) -> Iterable[GaugeMetricFamily]:
+        size = GaugeMetricFamily("db_pool_size", "Постоянных соединений в пуле", labels=["engine"])
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Выданных соединений", labels=["engine"])
+        overflow = GaugeMetricFamily("db_pool_overflow", "Соединений сверх pool_size", labels=["engine"])
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            if not hasattr(pool, "checkedout"):
+                continue
+            size.add_metric([name], pool.size())
+            checked_out.add_metric([name], pool.checkedout())
+            # до первого соединения QueuePool.overflow() отрицателен
+            overflow.add_metric([name], max(pool.overflow(), 0))
+        yield size
+        yield checked_out
+        yield overflow
+
+
+pool_collector = PoolCollector()
+REGISTRY.register(pool_collector)
+
+
+class QueryStats:
+    """Запросы к БД, выполненные за время одного запроса к API"""
+
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# пул потоков и run_sync копируют контекст, но объект в нём тот же — счёт общий на запрос
+current_queries: ContextVar[Optional[QueryStats]] = ContextVar("current_queries", default=None)
+
+
+def track_queries(engine):
+    """Считает запросы движка в QueryStats текущего запроса к API; фоновые задачи не считаются"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = current_queries.get()
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += time.perf_counter() - conn.info.pop("query_started", time.perf_counter())
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: число и время запросов по шаблону маршрута, а не по пути с id.
+
+    С query_headers=True в ответ добавляются X-DB-Queries и X-DB-Time-Ms — для отладки
+    и проверки бюджета запросов (benchmarks.query_budget).
+    """
+
+    def __init__(self, app, query_headers: bool = False):
+        self.app = app
+        self.query_headers = query_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+        queries = QueryStats()
+        token = current_queries.set(queries)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.query_headers:
+                    headers = MutableHeaders(scope=message)
+                    headers["X-DB-Queries"] = str(queries.count)
+                    headers["X-DB-Time-Ms"] = f"{queries.seconds * 1000:.2f}"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_queries.reset(token)
+            # маршрут кладёт в scope роутер FastAPI; без него — 404 на неизвестный путь
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            HTTP_LATENCY.labels(method, path).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(method, path, str(status)).inc()
+            DB_QUERIES.labels(method, path).observe(queries.count)
+            DB_QUERY_TIME.labels(method, path).observe(queries.seconds)
+
+
+def render() -> tuple:
+    """Тело и Content-Type ответа /metrics"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, BigInteger
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, BigInteger, Index, UniqueConstraint, text
 from .database import Base
 
 class User(Base):
@@ -7,20 +7,101 @@ class User(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     telegram_id = Column(BigInteger, unique=True, index=True)
-    username = Column(String, nullable=True)
+    username = Column(String, nullable=True, index=True)
     hashed_password = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     is_active = Column(Boolean, default=True)
+    # растёт при любой записи в привычки пользователя, из него строится ETag списка
+    habits_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # "HH:MM,HH:MM": время ежедневной сводки вместо отдельных напоминаний; NULL — сводка выключена
+    digest_times = Column(String, nullable=True)
 
 
 class Habit(Base):
     __tablename__ = "habits"
+    __table_args__ = (
+        UniqueConstraint("user_id", "name", name="uq_habits_user_id_name"),
+        Index("ix_habits_user_id_is_active_id", "user_id", "is_active", "id"),
+        Index(
+            "ix_habits_carry_over", "id", "last_completed",
+            postgresql_where=text("completion_count < 21"),
+            sqlite_where=text("completion_count < 21")
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     name = Column(String, index=True)
+    reminder_time = Column(String, nullable=True)
     completion_count = Column(Integer, default=0)
     streak = Column(Integer, default=0)
     last_completed = Column(DateTime, nullable=True)
     is_active = Column(Boolean, default=True)
-    job_id = Column(String, nullable=True)
\ No newline at end of file
+    job_id = Column(String, nullable=True)
+
+
+class HabitCompletion(Base):
+    """Журнал отметок: строки только добавляются, счётчики в habits пересчитываются по нему"""
+    __tablename__ = "habit_completions"
+    __table_args__ = (
+        Index("ix_habit_completions_habit_id_completed_at", "habit_id", "completed_at"),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    habit_id = Column(Integer, ForeignKey("habits.id", ondelete="CASCADE"), nullable=False)
+    completed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class SchedulerLease(Base):
+    """Аренда фоновых задач: планировщик работает только в процессе-владельце, пока не истёк срок"""
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    # последняя отработанная минута напоминаний — с неё продолжает новый владелец
+    last_run = Column(DateTime, nullable=True)
+
+
+class ScheduleChange(Base):
+    """Журнал изменений расписания напоминаний: привычки, сводка, привязка telegram_id.
+
+    Владелец планировщика перечитывает расписание только пользователей из свежих строк;
+    отметки привычек сюда не пишутся. Старые строки удаляет планировщик.
+    """
+    __tablename__ = "schedule_changes"
+    __table_args__ = (
+        Index("ix_schedule_changes_created_at", "created_at"),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class ReminderOutbox(Base):
+    """Исходящие напоминания: строки пишет планировщик, доставляют воркеры outbox.
+
+    status: pending — ждёт available_at, sending — забрана воркером до locked_until
+    (после этого её может забрать другой), sent и failed — конечные.
+    """
+    __tablename__ = "reminder_outbox"
+    __table_args__ = (
+        Index("ix_reminder_outbox_status_available_at", "status", "available_at"),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    # привычка или сводка и минута расписания: повторная постановка той же минуты не создаёт дубль
+    dedup_key = Column(String, nullable=False, unique=True)
+    chat_id = Column(BigInteger, nullable=False)
+    text = Column(Text, nullable=False)
+    reply_markup = Column(Text, nullable=True)
+    status = Column(String, nullable=False, default="pending", server_default="pending")
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)
+    # метка последнего забора: итог пишет только тот, чья пачка ещё не перехвачена
+    claim_token = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
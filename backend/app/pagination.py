@@ -0,0 +1,24 @@
+import base64
+import binascii
+
+CURSOR_PREFIX = "h:"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(last_id: int) -> str:
+    """Непрозрачный курсор на id последней привычки страницы"""
+    raw = f"{CURSOR_PREFIX}{last_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise InvalidCursor(cursor) from e
+    if not raw.startswith(CURSOR_PREFIX) or not raw[len(CURSOR_PREFIX):].isdigit():
+        raise InvalidCursor(cursor)
+    return int(raw[len(CURSOR_PREFIX):])
@@ -1,14 +1,17 @@
-from pydantic import BaseModel, constr
+from pydantic import BaseModel, conlist, constr
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 
+ReminderTime = constr(pattern=r'^([0-1]?[0-9]|2[0-3]):[0-5][0-9]$')
+
 class HabitBase(BaseModel):
     name: str
 
 
 class HabitCreate(HabitBase):
     telegram_id: int
+    reminder_time: Optional[ReminderTime] = None
 
 
 class HabitResponse(HabitBase):
@@ -16,6 +19,7 @@ class HabitResponse(HabitBase):
     user_id: int
     completion_count: int
     streak: int
+    reminder_time: Optional[str] = None
     last_completed: Optional[datetime] = None
     is_active: bool
     job_id: Optional[str] = None
@@ -27,6 +31,26 @@ class HabitResponse(HabitBase):
         }
 
 
+class HabitCompletionResponse(BaseModel):
+    completed_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class HabitBulkComplete(BaseModel):
+    telegram_id: int
+    habit_ids: conlist(int, min_length=1, max_length=100)
+
+
+class HabitCompletionResult(BaseModel):
+    habit_id: int
+    status: str
+    name: Optional[str] = None
+    completion_count: Optional[int] = None
+    streak: Optional[int] = None
+
+
 class UserBase(BaseModel):
     username: str
 
@@ -47,6 +71,17 @@ class UserCreate(UserBase):
     password: constr(min_length=6)
 
 
+class DigestSettings(BaseModel):
+    """Время ежедневной сводки; пустой список выключает сводку"""
+    telegram_id: int
+    times: conlist(ReminderTime, max_length=6)
+
+
+class DigestResponse(BaseModel):
+    times: List[str]
+
+
 class HabitUpdate(BaseModel):
     name: Optional[str] = None
+    reminder_time: Optional[ReminderTime] = None
     is_active: Optional[bool] = None
\ No newline at end of file
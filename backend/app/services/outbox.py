@@ -0,0 +1,213 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional
+
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from .. import crud
+from ..database import with_db
+from ..metrics import OUTBOX_DELIVERY_LAG, OUTBOX_MESSAGES
+from .telegram_sender import OutgoingMessage, TelegramSender, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+# как часто воркер без работы заглядывает в таблицу (сообщения своего процесса будят его сразу)
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+# сколько пачка принадлежит воркеру; не успел отчитаться — её забирает другой
+OUTBOX_CLAIM_SECONDS = float(os.getenv("OUTBOX_CLAIM_SECONDS", "120"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "300"))
+OUTBOX_RETENTION_HOURS = float(os.getenv("OUTBOX_RETENTION_HOURS", "48"))
+
+
+class OutboxMessage(NamedTuple):
+    dedup_key: str
+    chat_id: int
+    text: str
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+
+
+def backoff_seconds(attempt: int) -> float:
+    """Экспоненциальная пауза перед повтором с разбросом, чтобы повторы не шли пачкой"""
+    return min(2 ** attempt, OUTBOX_BACKOFF_MAX) * random.uniform(0.5, 1.0)
+
+
+class OutboxDispatcher:
+    """Доставка напоминаний через таблицу reminder_outbox: хотя бы один раз.
+
+    Планировщик только пишет сообщения в таблицу, поэтому перезапуск backend и ошибки
+    Telegram их не теряют. Воркеры всех процессов забирают пачки без пересечений,
+    повторяют неудачные попытки с паузой (на 429 — не меньше retry_after) и отмечают итог.
+    """
+
+    def __init__(
+            self,
+            sender: TelegramSender,
+            workers: int = OUTBOX_WORKERS,
+            batch_size: int = OUTBOX_BATCH_SIZE,
+            poll_seconds: float = OUTBOX_POLL_SECONDS,
+            claim_seconds: float = OUTBOX_CLAIM_SECONDS,
+            max_attempts: int = OUTBOX_MAX_ATTEMPTS
+    ):
+        self.sender = sender
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.claim_seconds = claim_seconds
+        self.max_attempts = max_attempts
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def add(self, messages: List[OutboxMessage]):
+        if not messages:
+            return
+        await with_db(crud.add_outbox_messages, [
+            {
+                "dedup_key": message.dedup_key,
+                "chat_id": message.chat_id,
+                "text": message.text,
+                "reply_markup": message.reply_markup.to_json() if message.reply_markup else None,
+                "status": "pending",
+                "available_at": datetime.utcnow(),
+                "created_at": datetime.utcnow(),
+            }
+            for message in messages
+        ])
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"outbox-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info("Воркеры outbox запущены: %d", self.workers)
+
+    async def stop(self, timeout: float = 10.0):
+        """Воркеры дописывают итог текущей пачки; не успевшие — её заберут после locked_until"""
+        if not self.running:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _idle(self):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _worker(self):
+        while not self._stopping:
+            token = uuid.uuid4().hex
+            try:
+                batch = await with_db(crud.claim_outbox_batch, self.batch_size, self.claim_seconds, token)
+            except Exception as e:
+                logger.warning("Не удалось забрать сообщения из outbox: %s", e)
+                await self._idle()
+                continue
+            if not batch:
+                await self._idle()
+                continue
+            # запас до locked_until, чтобы успеть записать итог, пока пачка ещё наша
+            deadline = time.monotonic() + self.claim_seconds * 0.8
+            results = []
+            for row in batch:
+                if self.sender.paused_for or time.monotonic() > deadline:
+                    # Telegram попросил подождать или время пачки на исходе: остальное
+                    # возвращается в очередь без траты попытки, а не ждёт под забором
+                    results.append(self._release(row, self.sender.paused_for))
+                else:
+                    results.append(await self._deliver(row))
+            try:
+                await with_db(crud.finish_outbox_batch, token, results)
+            except Exception as e:
+                # итог не записан: пачку повторно отправит тот, кто заберёт её после locked_until
+                logger.error("Не удалось отметить доставку %d сообщений: %s", len(results), e)
+
+    def _release(self, row, delay: float) -> dict:
+        return {
+            "_id": row.id,
+            "status": "pending",
+            "attempts": row.attempts - 1,
+            "available_at": datetime.utcnow() + timedelta(seconds=delay),
+            "sent_at": None,
+            "last_error": None,
+        }
+
+    async def _deliver(self, row) -> dict:
+        result = {
+            "_id": row.id,
+            "status": "sent",
+            "attempts": row.attempts,
+            "available_at": datetime.utcnow(),
+            "sent_at": None,
+            "last_error": None,
+        }
+        if row.attempts > self.max_attempts:
+            OUTBOX_MESSAGES.labels("failed").inc()
+            return {**result, "status": "failed", "last_error": "attempts exceeded"}
+
+        markup = InlineKeyboardMarkup.de_json(json.loads(row.reply_markup), None) if row.reply_markup else None
+        try:
+            await self.sender.send(OutgoingMessage(row.chat_id, row.text, reply_markup=markup))
+        except RetryAfter as e:
+            delay = max(retry_after_seconds(e), backoff_seconds(row.attempts))
+            return self._retry(result, row, delay, e)
+        except (BadRequest, Forbidden) as e:
+            # чат удалён или бот заблокирован: повтор не поможет
+            logger.warning("Telegram отклонил напоминание chat_id=%s: %s", row.chat_id, e)
+            OUTBOX_MESSAGES.labels("failed").inc()
+            return {**result, "status": "failed", "last_error": str(e)[:500]}
+        except NetworkError as e:
+            return self._retry(result, row, backoff_seconds(row.attempts), e)
+        except Exception as e:
+            logger.error("Ошибка отправки из outbox: %s", e, exc_info=True)
+            return self._retry(result, row, backoff_seconds(row.attempts), e)
+
+        now = datetime.utcnow()
+        OUTBOX_MESSAGES.labels("sent").inc()
+        OUTBOX_DELIVERY_LAG.observe(max((now - row.created_at).total_seconds(), 0))
+        return {**result, "sent_at": now}
+
+    def _retry(self, result: dict, row, delay: float, error: Exception) -> dict:
+        if row.attempts >= self.max_attempts:
+            logger.warning("Напоминание chat_id=%s не доставлено за %d попыток: %s", row.chat_id, row.attempts, error)
+            OUTBOX_MESSAGES.labels("failed").inc()
+            return {**result, "status": "failed", "last_error": str(error)[:500]}
+        OUTBOX_MESSAGES.labels("retry").inc()
+        return {
+            **result,
+            "status": "pending",
+            "available_at": datetime.utcnow() + timedelta(seconds=delay),
+            "last_error": str(error)[:500],
+        }
+
+    async def purge(self):
+        before = datetime.utcnow() - timedelta(hours=OUTBOX_RETENTION_HOURS)
+        deleted = await with_db(crud.purge_outbox, before)
+        if deleted:
+            logger.info("Удалено старых сообщений outbox: %d", deleted)
@@ -0,0 +1,304 @@
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..days import REMINDER_TIMEZONE, day_start
+from ..metrics import REMINDER_DISPATCH_LAG, REMINDERS_SUPPRESSED
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+MAX_CATCH_UP_MINUTES = 5
+
+
+class DueReminder(NamedTuple):
+    habit_id: int
+    telegram_id: int
+    habit_name: str
+    # минута расписания, за которую отправляется напоминание
+    minute: datetime
+
+
+# пользователи сводки {user_id: (telegram_id, минута)} и начало суток (UTC) -> отправлено сводок
+DigestFn = Callable[[Dict[int, Tuple[int, datetime]], datetime], Awaitable[int]]
+# habit_id наступивших напоминаний и начало текущих суток (UTC) -> {habit_id: причина не отправлять}
+SuppressFn = Callable[[List[int], datetime], Awaitable[Dict[int, str]]]
+
+
+def parse_reminder_time(value: Optional[str]) -> Optional[int]:
+    """Перевод 'HH:MM' в минуту суток; None для пустого или некорректного значения"""
+    if not value:
+        return None
+    try:
+        hours, minutes = value.split(":")
+        hours, minutes = int(hours), int(minutes)
+    except ValueError:
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+
+def parse_digest_times(value: Optional[str]) -> List[int]:
+    """Перевод 'HH:MM,HH:MM' в минуты суток; некорректные значения пропускаются"""
+    minutes = (parse_reminder_time(part.strip()) for part in (value or "").split(","))
+    return sorted({minute for minute in minutes if minute is not None})
+
+
+class ReminderWheel:
+    """Привычки, разложенные по минутам суток: одна корзина на минуту"""
+
+    def __init__(self):
+        self._buckets: List[Dict[int, Tuple[int, str]]] = [{} for _ in range(MINUTES_PER_DAY)]
+        self._minute_by_habit: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self._minute_by_habit)
+
+    def add(self, habit_id: int, minute: int, telegram_id: int, habit_name: str):
+        self.remove(habit_id)
+        self._buckets[minute][habit_id] = (telegram_id, habit_name)
+        self._minute_by_habit[habit_id] = minute
+
+    def remove(self, habit_id: int) -> bool:
+        minute = self._minute_by_habit.pop(habit_id, None)
+        if minute is None:
+            return False
+        self._buckets[minute].pop(habit_id, None)
+        return True
+
+    def load(self, rows: Iterable[Tuple[int, str, int, str]]) -> int:
+        """Полная замена содержимого строками (habit_id, reminder_time, telegram_id, name)"""
+        buckets: List[Dict[int, Tuple[int, str]]] = [{} for _ in range(MINUTES_PER_DAY)]
+        minute_by_habit: Dict[int, int] = {}
+        for habit_id, reminder_time, telegram_id, habit_name in rows:
+            minute = parse_reminder_time(reminder_time)
+            if minute is None or telegram_id is None:
+                continue
+            buckets[minute][habit_id] = (telegram_id, habit_name)
+            minute_by_habit[habit_id] = minute
+        self._buckets, self._minute_by_habit = buckets, minute_by_habit
+        return len(minute_by_habit)
+
+    def due(self, minute: int) -> List[Tuple[int, int, str]]:
+        return [
+            (habit_id, telegram_id, habit_name)
+            for habit_id, (telegram_id, habit_name) in self._buckets[minute].items()
+        ]
+
+
+class DigestSchedule:
+    """Пользователи в режиме сводки, разложенные по минутам суток"""
+
+    def __init__(self):
+        self._buckets: List[Dict[int, int]] = [{} for _ in range(MINUTES_PER_DAY)]
+        # user_id -> (telegram_id, минуты сводки)
+        self._users: Dict[int, Tuple[int, List[int]]] = {}
+        self._telegram_ids: Set[int] = set()
+
+    def __len__(self):
+        return len(self._users)
+
+    def __contains__(self, telegram_id: int) -> bool:
+        return telegram_id in self._telegram_ids
+
+    def add(self, user_id: int, telegram_id: int, minutes: List[int]):
+        self.remove(user_id)
+        for minute in minutes:
+            self._buckets[minute][user_id] = telegram_id
+        self._users[user_id] = (telegram_id, minutes)
+        self._telegram_ids.add(telegram_id)
+
+    def remove(self, user_id: int) -> bool:
+        entry = self._users.pop(user_id, None)
+        if entry is None:
+            return False
+        telegram_id, minutes = entry
+        for minute in minutes:
+            self._buckets[minute].pop(user_id, None)
+        self._telegram_ids.discard(telegram_id)
+        return True
+
+    def load(self, rows: Iterable[Tuple[int, int, str]]) -> int:
+        """Полная замена содержимого строками (user_id, telegram_id, digest_times)"""
+        schedule = DigestSchedule()
+        for user_id, telegram_id, digest_times in rows:
+            minutes = parse_digest_times(digest_times)
+            if minutes and telegram_id is not None:
+                schedule.add(user_id, telegram_id, minutes)
+        self._buckets, self._users, self._telegram_ids = schedule._buckets, schedule._users, schedule._telegram_ids
+        return len(self)
+
+    def due(self, minute: int) -> Dict[int, int]:
+        return dict(self._buckets[minute])
+
+
+class ReminderEngine:
+    """Раз в минуту отправляет напоминания только из наступившей корзины.
+
+    Привычки пользователей в режиме сводки в колесо не попадают: вместо них в минуты
+    сводки вызывается digest с пользователями, которым пора её получить.
+    """
+
+    def __init__(
+            self,
+            send: Callable[[List[DueReminder]], Awaitable[None]],
+            tz: ZoneInfo = REMINDER_TIMEZONE,
+            suppress: Optional[SuppressFn] = None,
+            digest: Optional[DigestFn] = None
+    ):
+        self.wheel = ReminderWheel()
+        self.digests = DigestSchedule()
+        self.tz = tz
+        self._send = send
+        self._suppress = suppress
+        self._digest = digest
+        self._last_tick: Optional[datetime] = None
+
+    def load_schedule(self, db: Session) -> Tuple[ReminderWheel, DigestSchedule]:
+        """Новые колесо и сводки из БД; текущее расписание не трогает, так что строить их
+        можно вне event loop, а подменять — через replace"""
+        started = time.perf_counter()
+        wheel, digests = ReminderWheel(), DigestSchedule()
+        wheel.load(db.execute(
+            select(
+                models.Habit.id,
+                models.Habit.reminder_time,
+                models.User.telegram_id,
+                models.Habit.name
+            )
+            .join(models.User, models.User.id == models.Habit.user_id)
+            .where(
+                models.Habit.is_active == True,
+                models.Habit.reminder_time.isnot(None),
+                models.User.digest_times.is_(None)
+            )
+            .execution_options(yield_per=10000)
+        ))
+        digests.load(db.execute(
+            select(models.User.id, models.User.telegram_id, models.User.digest_times)
+            .where(models.User.digest_times.isnot(None))
+        ))
+        logger.info(
+            "Загружено напоминаний: %d, пользователей со сводкой: %d за %.3f с",
+            len(wheel), len(digests), time.perf_counter() - started
+        )
+        return wheel, digests
+
+    def replace(self, wheel: ReminderWheel, digests: DigestSchedule):
+        self.wheel, self.digests = wheel, digests
+
+    def rehydrate(self, db: Session) -> int:
+        self.replace(*self.load_schedule(db))
+        return len(self.wheel)
+
+    def load_user(self, user_id: int, telegram_id: Optional[int], digest_times: Optional[str],
+                  habits: Iterable[Tuple[int, Optional[str], str, bool]]):
+        """Перечитанное расписание пользователя: привычки (habit_id, reminder_time, name, is_active)
+        раскладываются между колесом и сводкой, выключенные убираются. Удалённые привычки
+        убирает рассылка, когда suppress вернёт для них "inactive" """
+        minutes = parse_digest_times(digest_times)
+        if minutes and telegram_id is not None:
+            self.digests.add(user_id, telegram_id, minutes)
+        else:
+            self.digests.remove(user_id)
+        for habit_id, reminder_time, habit_name, is_active in habits:
+            if is_active:
+                self.schedule(habit_id, reminder_time, telegram_id, habit_name)
+            else:
+                self.unschedule(habit_id)
+
+    def schedule(self, habit_id: int, reminder_time: Optional[str], telegram_id: Optional[int], habit_name: str):
+        minute = parse_reminder_time(reminder_time)
+        if minute is None or telegram_id is None or telegram_id in self.digests:
+            self.wheel.remove(habit_id)
+            return
+        self.wheel.add(habit_id, minute, telegram_id, habit_name)
+
+    def unschedule(self, habit_id: int):
+        self.wheel.remove(habit_id)
+
+    @property
+    def last_tick(self) -> Optional[datetime]:
+        return self._last_tick
+
+    def resume(self, last_tick: Optional[datetime]):
+        """Продолжить с минуты, отработанной прошлым владельцем расписания: пропущенные
+        с тех пор минуты (не больше MAX_CATCH_UP_MINUTES) отправятся на следующем tick"""
+        self._last_tick = last_tick.astimezone(self.tz).replace(second=0, microsecond=0) if last_tick else None
+
+    def _minutes_to_fire(self, now: datetime) -> List[datetime]:
+        if self._last_tick is None:
+            return [now]
+        if now <= self._last_tick:
+            return []
+        first = max(self._last_tick + timedelta(minutes=1), now - timedelta(minutes=MAX_CATCH_UP_MINUTES))
+        minutes = []
+        while first <= now:
+            minutes.append(first)
+            first += timedelta(minutes=1)
+        return minutes
+
+    async def tick(self, now: Optional[datetime] = None) -> int:
+        fired_at = datetime.now(self.tz)
+        now = (now or fired_at).replace(second=0, microsecond=0)
+        due: List[DueReminder] = []
+        digest_due: Dict[int, Tuple[int, datetime]] = {}
+        for moment in self._minutes_to_fire(now):
+            minute = moment.hour * 60 + moment.minute
+            bucket = self.wheel.due(minute)
+            users = self.digests.due(minute)
+            if bucket or users:
+                REMINDER_DISPATCH_LAG.observe(max((fired_at - moment).total_seconds(), 0))
+            due.extend(DueReminder(*item, moment) for item in bucket)
+            digest_due.update((user_id, (telegram_id, moment)) for user_id, telegram_id in users.items())
+
+        try:
+            if due and self._suppress is not None:
+                due = await self._filter_due(due, now)
+            if due:
+                await self._send(due)
+                logger.info("Отправлено напоминаний за %s: %d", now.strftime("%H:%M"), len(due))
+            sent_digests = 0
+            if digest_due and self._digest is not None:
+                sent_digests = await self._digest(digest_due, self._day_start(now))
+                logger.info(
+                    "Отправлено сводок за %s: %d из %d", now.strftime("%H:%M"), sent_digests, len(digest_due)
+                )
+        except Exception:
+            # минута не засчитана: следующий tick отправит её ещё раз
+            if self._last_tick is None:
+                self._last_tick = now - timedelta(minutes=1)
+            raise
+        if self._last_tick is None or now > self._last_tick:
+            self._last_tick = now
+        return len(due) + sent_digests
+
+    def _day_start(self, now: datetime) -> datetime:
+        return day_start(now, tz=self.tz)
+
+    async def _filter_due(self, due: List[DueReminder], now: datetime) -> List[DueReminder]:
+        """Убирает привычки, уже отмеченные сегодня или выключенные, одним запросом на tick"""
+        try:
+            suppressed = await self._suppress([reminder.habit_id for reminder in due], self._day_start(now))
+        except Exception as e:
+            # лишнее напоминание лучше пропущенного
+            logger.warning("Не удалось проверить отметки перед рассылкой: %s", e)
+            return due
+        if not suppressed:
+            return due
+        for habit_id, reason in suppressed.items():
+            REMINDERS_SUPPRESSED.labels(reason).inc()
+            if reason == "inactive":
+                self.wheel.remove(habit_id)
+        logger.info(
+            "Пропущено напоминаний за %s: %d (уже выполнены: %d)", now.strftime("%H:%M"),
+            len(suppressed), sum(1 for reason in suppressed.values() if reason == "completed")
+        )
+        return [reminder for reminder in due if reminder.habit_id not in suppressed]
@@ -0,0 +1,184 @@
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+
+from .. import crud
+from ..database import with_db, with_sync_db
+from ..metrics import SCHEDULER_LEADER
+from .outbox import OutboxDispatcher
+from ..days import REMINDER_TIMEZONE
+from .reminders import ReminderEngine
+
+logger = logging.getLogger(__name__)
+
+LEASE_NAME = "scheduler"
+# срок аренды и период её продления; часы процессов должны быть синхронизированы точнее LEASE_TTL
+LEASE_TTL = float(os.getenv("SCHEDULER_LEASE_TTL", "30"))
+LEASE_HEARTBEAT = float(os.getenv("SCHEDULER_HEARTBEAT", "10"))
+# как часто владелец сверяет расписание с изменениями, сделанными другими процессами
+REMINDER_RESYNC_SECONDS = float(os.getenv("REMINDER_RESYNC_SECONDS", "60"))
+# сверка перечитывает и изменения чуть старше прошлой: транзакции фиксируются не в порядке
+# created_at, а часы процессов немного расходятся
+SCHEDULE_CHANGES_LOOKBACK = float(os.getenv("SCHEDULE_CHANGES_LOOKBACK", "60"))
+SCHEDULE_CHANGES_RETENTION_HOURS = float(os.getenv("SCHEDULE_CHANGES_RETENTION_HOURS", "24"))
+
+
+class LeaderScheduler:
+    """Все фоновые задачи backend: напоминания, ночной перенос серий и чистка outbox.
+
+    Планировщик запущен в каждом процессе uvicorn, но задачи выполняет только владелец
+    аренды в таблице scheduler_leases. Остальные раз в LEASE_HEARTBEAT пытаются её забрать,
+    поэтому после падения владельца задачи переходят к другому процессу за LEASE_TTL.
+    Владелец, не сумевший вовремя продлить аренду, сразу перестаёт отправлять напоминания,
+    так что два процесса не рассылают одну минуту дважды.
+    """
+
+    def __init__(
+            self,
+            reminders: ReminderEngine,
+            outbox: Optional[OutboxDispatcher] = None,
+            owner: Optional[str] = None
+    ):
+        self.reminders = reminders
+        self.outbox = outbox
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.scheduler = AsyncIOScheduler(timezone=REMINDER_TIMEZONE)
+        self.is_leader = False
+        self._lease_deadline = 0.0
+        # с какого момента сверка ищет изменения расписания
+        self._changes_since: Optional[datetime] = None
+
+    @property
+    def holds_lease(self) -> bool:
+        return self.is_leader and time.monotonic() < self._lease_deadline
+
+    def start(self):
+        self.scheduler.add_job(
+            self.heartbeat, IntervalTrigger(seconds=LEASE_HEARTBEAT), id="lease_heartbeat",
+            next_run_time=self._now(), max_instances=1, coalesce=True
+        )
+        self.scheduler.add_job(
+            self.tick, CronTrigger(second=0), id="reminders_tick",
+            max_instances=1, coalesce=True, misfire_grace_time=30
+        )
+        self.scheduler.add_job(
+            self.resync, IntervalTrigger(seconds=REMINDER_RESYNC_SECONDS), id="reminders_resync",
+            max_instances=1, coalesce=True
+        )
+        self.scheduler.add_job(
+            self.carry_over, CronTrigger(hour=23, minute=59), id="habits_carry_over",
+            max_instances=1, coalesce=True, misfire_grace_time=3600
+        )
+        self.scheduler.add_job(
+            self.purge_schedule_changes, CronTrigger(minute=40), id="schedule_changes_purge",
+            max_instances=1, coalesce=True, misfire_grace_time=3600
+        )
+        if self.outbox is not None:
+            self.scheduler.add_job(
+                self.purge_outbox, CronTrigger(minute=30), id="outbox_purge",
+                max_instances=1, coalesce=True, misfire_grace_time=3600
+            )
+        self.scheduler.start()
+        logger.info("Планировщик запущен: %s", self.owner)
+
+    async def stop(self):
+        self.scheduler.shutdown(wait=False)
+        if self.is_leader:
+            self._set_leader(False)
+            try:
+                await with_db(crud.release_lease, LEASE_NAME, self.owner)
+            except Exception as e:
+                logger.warning("Не удалось освободить аренду планировщика: %s", e)
+
+    def _now(self) -> datetime:
+        return datetime.now(REMINDER_TIMEZONE)
+
+    def _set_leader(self, value: bool):
+        self.is_leader = value
+        SCHEDULER_LEADER.set(int(value))
+
+    async def heartbeat(self):
+        started = time.monotonic()
+        try:
+            acquired = await with_db(crud.acquire_lease, LEASE_NAME, self.owner, LEASE_TTL)
+        except Exception as e:
+            logger.warning("Не удалось продлить аренду планировщика: %s", e)
+            return
+        if not acquired:
+            if self.is_leader:
+                logger.warning("Аренда планировщика перешла к другому процессу")
+                self._set_leader(False)
+            return
+        # срок считается от начала запроса: ответ мог прийти с задержкой
+        self._lease_deadline = started + LEASE_TTL
+        if not self.is_leader:
+            await self._take_over()
+
+    async def _take_over(self):
+        last_run = await with_db(crud.get_lease_last_run, LEASE_NAME)
+        await self._rehydrate()
+        self.reminders.resume(last_run.replace(tzinfo=timezone.utc) if last_run else None)
+        self._set_leader(True)
+        logger.info(
+            "Процесс %s стал владельцем планировщика, напоминаний: %d, последняя минута: %s",
+            self.owner, len(self.reminders.wheel), last_run
+        )
+
+    async def _rehydrate(self):
+        started = datetime.utcnow()
+        # строки и новое колесо обрабатываются в пуле потоков, на event loop — только подмена
+        self.reminders.replace(*await with_sync_db(self.reminders.load_schedule))
+        self._changes_since = started
+
+    async def resync(self):
+        """Изменения расписания из других процессов попадают к владельцу здесь: перечитываются
+        только пользователи из свежих строк schedule_changes, отметки их не создают"""
+        if not self.holds_lease or self._changes_since is None:
+            return
+        started = datetime.utcnow()
+        since = self._changes_since - timedelta(seconds=SCHEDULE_CHANGES_LOOKBACK)
+        schedules = await with_db(crud.get_changed_schedules, since)
+        for schedule in schedules:
+            self.reminders.load_user(*schedule)
+        self._changes_since = started
+        if schedules:
+            logger.info("Перечитано расписание пользователей: %d", len(schedules))
+
+    async def tick(self):
+        if not self.holds_lease:
+            return
+        await self.reminders.tick()
+        last_tick = self.reminders.last_tick
+        if last_tick is None:
+            return
+        recorded = await with_db(
+            crud.record_lease_run, LEASE_NAME, self.owner,
+            last_tick.astimezone(timezone.utc).replace(tzinfo=None)
+        )
+        if not recorded:
+            logger.warning("Аренда планировщика потеряна во время рассылки")
+            self._set_leader(False)
+
+    async def carry_over(self):
+        if not self.holds_lease:
+            return
+        await with_db(crud.carry_over_habits)
+
+    async def purge_outbox(self):
+        if not self.holds_lease:
+            return
+        await self.outbox.purge()
+
+    async def purge_schedule_changes(self):
+        if not self.holds_lease:
+            return
+        before = datetime.utcnow() - timedelta(hours=SCHEDULE_CHANGES_RETENTION_HOURS)
+        await with_db(crud.purge_schedule_changes, before)
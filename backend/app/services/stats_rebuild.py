@@ -0,0 +1,139 @@
+"""Пересчёт completion_count, streak и last_completed по журналу habit_completions.
+
+Привычки делятся на шарды по user_id % shards, каждый шард считает отдельный процесс.
+Привычки без записей в журнале не трогаются: отметки до появления журнала в нём отсутствуют.
+
+Запуск из каталога backend:
+    python -m app.services.stats_rebuild --shards 4
+    python -m app.services.stats_rebuild --shards 4 --dry-run
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import bindparam, select, update
+
+from ..days import local_date
+
+logger = logging.getLogger(__name__)
+
+UPDATE_BATCH_SIZE = 1000
+# столько подряд дней держат привычку от сброса серии при переносе, см. crud.carry_over_habits
+CARRY_OVER_LIMIT = 21
+
+
+def stats_from_completions(completed_at: List[datetime], today: date) -> Tuple[int, int, datetime]:
+    """(completion_count, streak, last_completed) по отсортированным отметкам привычки"""
+    streak = 0
+    previous_day = None
+    for moment in completed_at:
+        day = local_date(moment)
+        if previous_day is None or day - previous_day > timedelta(days=1):
+            streak = 1
+        elif day != previous_day:
+            streak += 1
+        previous_day = day
+
+    count = len(completed_at)
+    if previous_day < today - timedelta(days=1) and count < CARRY_OVER_LIMIT:
+        streak = 0
+    return count, streak, completed_at[-1]
+
+
+def group_by_habit(rows: Iterable[tuple]):
+    """(habit_id, user_id, текущие счётчики, отметки) из строк, отсортированных по habit_id"""
+    habit_id, owner_id, current, moments = None, None, None, []
+    for row_habit_id, user_id, count, streak, last, completed_at in rows:
+        if row_habit_id != habit_id and moments:
+            yield habit_id, owner_id, current, moments
+            moments = []
+        habit_id, owner_id, current = row_habit_id, user_id, (count, streak, last)
+        moments.append(completed_at)
+    if moments:
+        yield habit_id, owner_id, current, moments
+
+
+def rebuild_shard(shard: int, shards: int, dry_run: bool = False) -> dict:
+    """Пересчитывает привычки пользователей с user_id % shards == shard"""
+    from ..database import SessionLocal
+    from ..crud import bump_habits_version
+    from ..models import Habit, HabitCompletion
+
+    today = local_date(datetime.utcnow())
+    checked = changed = 0
+    habits = Habit.__table__
+    # Core-UPDATE по таблице: executemany без ORM-синхронизации сессии
+    stmt = (
+        update(habits)
+        .where(habits.c.id == bindparam("b_id"))
+        .values(
+            completion_count=bindparam("b_count"),
+            streak=bindparam("b_streak"),
+            last_completed=bindparam("b_last")
+        )
+    )
+
+    reader = SessionLocal()
+    writer = SessionLocal()
+    try:
+        rows = reader.execute(
+            select(
+                HabitCompletion.habit_id, Habit.user_id, Habit.completion_count, Habit.streak,
+                Habit.last_completed, HabitCompletion.completed_at
+            )
+            .join(Habit, Habit.id == HabitCompletion.habit_id)
+            .where(Habit.user_id % shards == shard)
+            .order_by(HabitCompletion.habit_id, HabitCompletion.completed_at)
+            .execution_options(yield_per=10000)
+        )
+
+        batch, owners = [], set()
+        for habit_id, user_id, current, moments in group_by_habit(rows):
+            checked += 1
+            stats = stats_from_completions(moments, today)
+            if current == stats:
+                continue
+            changed += 1
+            batch.append({"b_id": habit_id, "b_count": stats[0], "b_streak": stats[1], "b_last": stats[2]})
+            owners.add(user_id)
+            if len(batch) >= UPDATE_BATCH_SIZE and not dry_run:
+                writer.execute(stmt, batch)
+                bump_habits_version(writer, *owners)
+                writer.commit()
+                batch, owners = [], set()
+        if batch and not dry_run:
+            writer.execute(stmt, batch)
+            bump_habits_version(writer, *owners)
+            writer.commit()
+    finally:
+        reader.close()
+        writer.close()
+
+    logger.info("Шард %d/%d: привычек с журналом %d, изменено %d", shard, shards, checked, changed)
+    return {"shard": shard, "habits": checked, "changed": changed}
+
+
+def rebuild(shards: int, dry_run: bool = False) -> List[dict]:
+    # spawn: каждый процесс открывает свои соединения вместо унаследованного пула
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=shards, mp_context=context) as pool:
+        futures = [pool.submit(rebuild_shard, shard, shards, dry_run) for shard in range(shards)]
+        return [future.result() for future in futures]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать расхождения")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(rebuild(args.shards, args.dry_run), indent=2))
+
+
+if __name__ == "__main__":
+    main()
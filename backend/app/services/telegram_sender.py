@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import timedelta
+from typing import Dict, NamedTuple, Optional
+
+from telegram import Bot, InlineKeyboardMarkup
+from telegram.error import RetryAfter, TelegramError
+from telegram.request import HTTPXRequest
+
+from ..metrics import TELEGRAM_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+# адрес Bot API; для офлайн-прогонов — локальный benchmarks.fake_telegram
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+MAX_CHAT_BUCKETS = 50000
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity за раз"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def idle(self) -> bool:
+        now = time.monotonic()
+        return now >= self._blocked_until and self._tokens + (now - self._updated) * self.rate >= self.capacity
+
+    @property
+    def blocked_for(self) -> float:
+        """Сколько ещё секунд действует пауза из retry_after"""
+        return max(self._blocked_until - time.monotonic(), 0.0)
+
+    def block(self, seconds: float):
+        """Запрет выдачи токенов на время, указанное Telegram в retry_after"""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    delay = error.retry_after
+    if isinstance(delay, timedelta):
+        delay = delay.total_seconds()
+    return float(delay)
+
+
+class OutgoingMessage(NamedTuple):
+    chat_id: int
+    text: str
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+
+
+class TelegramSender:
+    """Единый клиент Telegram с ограничением скорости. Очереди и повторов здесь нет:
+    сообщения доставляют воркеры OutboxDispatcher, по одному соединению на воркера"""
+
+    def __init__(
+            self,
+            token: Optional[str],
+            pool_size: int = 8,
+            global_rate: float = GLOBAL_RATE,
+            chat_rate: float = CHAT_RATE,
+            chat_burst: float = CHAT_BURST,
+            api_url: str = TELEGRAM_API_URL
+    ):
+        self.token = token
+        self.api_url = api_url
+        self.pool_size = pool_size
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.bot: Optional[Bot] = None
+        self.sent = 0
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+
+    @property
+    def running(self) -> bool:
+        return self.bot is not None
+
+    async def start(self):
+        if self.running:
+            return
+        self.bot = Bot(
+            token=self.token,
+            base_url=f"{self.api_url}/bot",
+            base_file_url=f"{self.api_url}/file/bot",
+            request=HTTPXRequest(connection_pool_size=self.pool_size, pool_timeout=10.0)
+        )
+        try:
+            await self.bot.initialize()
+        except TelegramError as e:
+            logger.warning("Не удалось проверить токен бота: %s", e)
+
+    async def stop(self):
+        if not self.running:
+            return
+        await self.bot.shutdown()
+        self.bot = None
+
+    @property
+    def paused_for(self) -> float:
+        return self._global_bucket.blocked_for
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_CHAT_BUCKETS:
+                self._chat_buckets = {
+                    key: value for key, value in self._chat_buckets.items() if not value.idle
+                }
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def send(self, message: OutgoingMessage):
+        """Одна попытка в пределах лимитов; на 429 отправка для всех приостанавливается
+        на retry_after, ошибки пробрасываются вызывающему"""
+        await self._chat_bucket(message.chat_id).acquire()
+        await self._global_bucket.acquire()
+        try:
+            await self.bot.send_message(
+                chat_id=message.chat_id, text=message.text, reply_markup=message.reply_markup
+            )
+        except RetryAfter as e:
+            logger.warning("Telegram просит подождать %s с", retry_after_seconds(e))
+            TELEGRAM_MESSAGES.labels("rate_limited").inc()
+            self._global_bucket.block(retry_after_seconds(e))
+            raise
+        self.sent += 1
+        TELEGRAM_MESSAGES.labels("sent").inc()
+        logger.debug("Сообщение отправлено: chat_id=%s", message.chat_id)
@@ -0,0 +1,69 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from ..metrics import CACHE_REQUESTS
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
+
+class UserIdentity(NamedTuple):
+    id: int
+    telegram_id: int
+    username: Optional[str]
+
+
+class UserCache:
+    """LRU-кэш telegram_id -> UserIdentity с ограничением времени жизни записи.
+
+    Используется только из event loop, поэтому обходится без блокировок.
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._hits = CACHE_REQUESTS.labels("users", "hit")
+        self._misses = CACHE_REQUESTS.labels("users", "miss")
+        self._entries: "OrderedDict[int, Tuple[float, UserIdentity]]" = OrderedDict()
+        self._telegram_by_user: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, telegram_id: int) -> Optional[UserIdentity]:
+        entry = self._entries.get(telegram_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self.invalidate(telegram_id)
+            self._misses.inc()
+            return None
+        self._entries.move_to_end(telegram_id)
+        self._hits.inc()
+        return entry[1]
+
+    def put(self, user) -> UserIdentity:
+        identity = UserIdentity(user.id, user.telegram_id, user.username)
+        self.invalidate_user(identity.id)
+        self._entries[identity.telegram_id] = (time.monotonic() + self.ttl, identity)
+        self._entries.move_to_end(identity.telegram_id)
+        self._telegram_by_user[identity.id] = identity.telegram_id
+        while len(self._entries) > self.maxsize:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._telegram_by_user.pop(evicted.id, None)
+        return identity
+
+    def invalidate(self, telegram_id: int):
+        entry = self._entries.pop(telegram_id, None)
+        if entry is not None:
+            self._telegram_by_user.pop(entry[1].id, None)
+
+    def invalidate_user(self, user_id: int):
+        telegram_id = self._telegram_by_user.pop(user_id, None)
+        if telegram_id is not None:
+            self._entries.pop(telegram_id, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._telegram_by_user.clear()
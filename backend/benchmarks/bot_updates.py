@@ -0,0 +1,183 @@
+"""Пропускная способность бота: polling против webhook, по очереди против параллельно.
+
+Бот запускается отдельным процессом против benchmarks.fake_telegram и медленного
+benchmarks.fake_backend. Каждый из --users пользователей шлёт /login, логин с паролем
+и /list — три update, два из которых ходят в backend, а второй зависит от состояния
+диалога после первого. Для каждого режима печатается время до последнего ответа,
+update в секунду, p50/p95 времени пользователя и сколько пользователей получили
+ответы в правильном порядке (иначе параллельная обработка сломала диалог).
+
+Запуск из каталога backend:
+    python -m benchmarks.bot_updates --users 200 --backend-latency-ms 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.common import BACKEND_DIR, free_port, percentile, run_uvicorn, telegram_id
+
+BOT_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "bot")
+WEBHOOK_PATH = "telegram"
+WEBHOOK_SECRET = "benchmark-secret"
+# что должен ответить бот на каждый из трёх update, если диалог не развалился
+EXPECTED_REPLIES = ("Введите имя пользователя", "✅ Регистрация", "📋 Ваши привычки")
+
+MODES = {
+    "polling-sequential": {"BOT_MODE": "polling", "BOT_CONCURRENCY": "1"},
+    "polling-concurrent": {"BOT_MODE": "polling"},
+    "webhook-concurrent": {"BOT_MODE": "webhook"},
+}
+
+
+def user_updates(index: int) -> List[dict]:
+    chat_id = telegram_id(index)
+    user = {"id": chat_id, "is_bot": False, "first_name": f"user{index}"}
+    chat = {"id": chat_id, "type": "private"}
+
+    def message(text: str, command: bool = False) -> dict:
+        payload = {"message_id": 1, "date": int(time.time()), "chat": chat, "from": user, "text": text}
+        if command:
+            payload["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+        return {"message": payload}
+
+    return [message("/login", True), message(f"user{index} benchmark"), message("/list", True)]
+
+
+def start_bot(env: Dict[str, str], log):
+    return subprocess.Popen(
+        [sys.executable, "main.py"], cwd=BOT_DIR, env={**os.environ, **env},
+        stdout=subprocess.DEVNULL, stderr=log
+    )
+
+
+async def wait_ready(telegram: httpx.AsyncClient, method: str, bot: subprocess.Popen):
+    deadline = time.monotonic() + 60
+    while (await telegram.get("/_stats")).json()["calls"].get(method, 0) == 0:
+        if bot.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError("бот не запустился, см. лог")
+        await asyncio.sleep(0.1)
+
+
+async def push_polling(telegram: httpx.AsyncClient, users: int):
+    # все update сразу в очередь getUpdates — бот забирает их пачками по порядку
+    for index in range(1, users + 1):
+        for update in user_updates(index):
+            await telegram.post("/_updates", json=update)
+
+
+async def push_webhook(webhook_url: str, users: int):
+    # Telegram не шлёт следующий update чата, пока не получил ответ на предыдущий
+    async with httpx.AsyncClient(headers={"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET}) as client:
+        async def send_user(index: int):
+            for update_id, update in enumerate(user_updates(index), start=index * 10):
+                response = await client.post(webhook_url, json={**update, "update_id": update_id})
+                response.raise_for_status()
+
+        await asyncio.gather(*(send_user(index) for index in range(1, users + 1)))
+
+
+async def run_mode(name: str, telegram_url: str, backend_url: str, args) -> dict:
+    env = {
+        **MODES[name],
+        "TELEGRAM_BOT_TOKEN": "123456:benchmark",
+        "TELEGRAM_API_URL": telegram_url,
+        "API_URL": backend_url,
+        "BOT_CONCURRENCY": MODES[name].get("BOT_CONCURRENCY", str(args.concurrency)),
+        "HABITS_CACHE_SIZE": "0",
+        "BOT_PERSISTENCE_PATH": os.path.join(tempfile.mkdtemp(), "bot_state.sqlite3"),
+    }
+    webhook_port = free_port()
+    if MODES[name]["BOT_MODE"] == "webhook":
+        env.update({
+            "WEBHOOK_LISTEN": "127.0.0.1",
+            "WEBHOOK_PORT": str(webhook_port),
+            "WEBHOOK_PATH": WEBHOOK_PATH,
+            "WEBHOOK_URL": f"http://127.0.0.1:{webhook_port}/{WEBHOOK_PATH}",
+            "WEBHOOK_SECRET": WEBHOOK_SECRET,
+        })
+
+    async with httpx.AsyncClient(base_url=telegram_url) as telegram:
+        await telegram.post("/_reset")
+        with tempfile.TemporaryFile() as log:
+            bot = start_bot(env, log)
+            try:
+                if MODES[name]["BOT_MODE"] == "webhook":
+                    await wait_ready(telegram, "setWebhook", bot)
+                    await asyncio.sleep(0.5)
+                else:
+                    await wait_ready(telegram, "getUpdates", bot)
+
+                started_wall, started = time.time(), time.perf_counter()
+                if MODES[name]["BOT_MODE"] == "webhook":
+                    await push_webhook(f"http://127.0.0.1:{webhook_port}/{WEBHOOK_PATH}", args.users)
+                else:
+                    await push_polling(telegram, args.users)
+
+                expected = args.users * len(EXPECTED_REPLIES)
+                deadline = time.perf_counter() + args.timeout
+                while True:
+                    stats = (await telegram.get("/_stats")).json()
+                    if stats["delivered"] >= expected or time.perf_counter() > deadline:
+                        break
+                    await asyncio.sleep(0.05)
+                elapsed = time.perf_counter() - started
+            finally:
+                bot.terminate()
+                try:
+                    bot.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    bot.kill()
+            if bot.returncode not in (0, -15) and args.verbose:
+                log.seek(0)
+                print(log.read().decode()[-3000:], file=sys.stderr)
+
+    finished: Dict[int, float] = {}
+    for chat_id, received_at in stats["received"]:
+        finished[chat_id] = max(finished.get(chat_id, 0.0), received_at - started_wall)
+    in_order = sum(
+        1 for texts in stats["texts"].values()
+        if len(texts) == len(EXPECTED_REPLIES)
+        and all(text.startswith(prefix) for text, prefix in zip(texts, EXPECTED_REPLIES))
+    )
+    return {
+        "mode": name,
+        "users": args.users,
+        "updates": expected,
+        "replies": stats["delivered"],
+        "seconds": round(elapsed, 3),
+        "updates_per_s": round(stats["delivered"] / elapsed, 1),
+        "user_p50_s": round(percentile(list(finished.values()), 50), 3),
+        "user_p95_s": round(percentile(list(finished.values()), 95), 3),
+        "users_in_order": in_order,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32, help="BOT_CONCURRENCY параллельных режимов")
+    parser.add_argument("--backend-latency-ms", type=float, default=100.0)
+    parser.add_argument("--telegram-latency-ms", type=float, default=10.0)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--verbose", action="store_true", help="печатать лог упавшего бота")
+    args = parser.parse_args()
+
+    telegram_env = {"FAKE_TG_LATENCY_MS": str(args.telegram_latency_ms), "FAKE_TG_JITTER_MS": "0"}
+    backend_env = {"FAKE_BACKEND_LATENCY_MS": str(args.backend_latency_ms)}
+    with run_uvicorn("benchmarks.fake_telegram:app", telegram_env, ready_path="/_stats") as telegram_url, \
+            run_uvicorn("benchmarks.fake_backend:app", backend_env, ready_path="/_health") as backend_url:
+        results = [asyncio.run(run_mode(name, telegram_url, backend_url, args)) for name in args.modes]
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Бенчмарк ночного переноса привычек: чанковые UPDATE против прежнего цикла по ORM-объектам.
+
+Запуск из каталога backend:
+    python -m benchmarks.carry_over --habits 1000000
+Каждый вариант выполняется в отдельном процессе, чтобы честно измерить пик памяти (ru_maxrss).
+"""
+import argparse
+import json
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, update
+
+from benchmarks.common import seed, temp_sqlite_url
+
+
+def mark_stale(database_url: str, stale_percent: int):
+    from app import models
+
+    engine = create_engine(database_url)
+    with engine.begin() as conn:
+        conn.execute(update(models.Habit).values(streak=0, last_completed=datetime.utcnow()))
+        conn.execute(
+            update(models.Habit)
+            .where(models.Habit.id % 100 < stale_percent)
+            .values(streak=3, completion_count=5, last_completed=datetime.utcnow() - timedelta(days=3))
+        )
+    engine.dispose()
+
+
+def legacy_carry_over(db):
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    from app import models
+    habits = db.query(models.Habit).filter(
+        models.Habit.last_completed < yesterday.date(),
+        models.Habit.completion_count < 21
+    ).all()
+
+    for habit in habits:
+        habit.streak = 0
+    db.commit()
+    return len(habits)
+
+
+def run_variant(database_url: str, variant: str, chunk_size: int) -> dict:
+    os.environ["DATABASE_URL"] = database_url
+    from app import crud
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        if variant == "legacy":
+            rows = legacy_carry_over(db)
+            chunks = None
+        else:
+            chunk_stats = crud.carry_over_habits(db, chunk_size=chunk_size)
+            rows = sum(chunk["rows"] for chunk in chunk_stats)
+            chunks = {
+                "count": len(chunk_stats),
+                "max_seconds": max((chunk["seconds"] for chunk in chunk_stats), default=0),
+            }
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+    return {
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "chunks": chunks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="по умолчанию — временная SQLite")
+    parser.add_argument("--habits", type=int, default=1_000_000)
+    parser.add_argument("--habits-per-user", type=int, default=10)
+    parser.add_argument("--stale-percent", type=int, default=30)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    database_url = args.database_url or temp_sqlite_url()
+    seed(database_url, args.habits // args.habits_per_user, args.habits_per_user)
+
+    results = {"habits": args.habits, "stale_percent": args.stale_percent}
+    variants = ["chunked"] if args.skip_legacy else ["legacy", "chunked"]
+    for variant in variants:
+        mark_stale(database_url, args.stale_percent)
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results[variant] = pool.submit(run_variant, database_url, variant, args.chunk_size).result()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
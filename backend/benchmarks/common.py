@@ -0,0 +1,181 @@
+"""Общие помощники бенчмарков: локальная БД, наполнение данными, запуск uvicorn и нагрузка."""
+import asyncio
+import contextlib
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy import create_engine, insert
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TELEGRAM_ID_BASE = 10_000_000
+PASSWORD = "benchmark"
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def temp_sqlite_url() -> str:
+    return f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='habits_bench_'), 'bench.db')}"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def telegram_id(user_index: int) -> int:
+    return TELEGRAM_ID_BASE + user_index
+
+
+def seed(database_url: str, users: int, habits_per_user: int, batch: int = 50_000):
+    """Пересоздаёт схему и заполняет её пользователями user1..userN и их привычками"""
+    # app.database создаёт движок при импорте — направляем его в ту же БД
+    os.environ.setdefault("DATABASE_URL", database_url)
+    from passlib.context import CryptContext
+    from app import models
+
+    engine = create_engine(database_url)
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    hashed_password = CryptContext(schemes=["bcrypt"]).hash(PASSWORD)
+    rnd = random.Random(42)
+
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {
+                "id": i,
+                "telegram_id": telegram_id(i),
+                "username": f"user{i}",
+                "hashed_password": hashed_password,
+                "is_active": True,
+            }
+            for i in range(1, users + 1)
+        ])
+        habit_id = 0
+        rows = []
+        for user_id in range(1, users + 1):
+            for n in range(habits_per_user):
+                habit_id += 1
+                rows.append({
+                    "id": habit_id,
+                    "user_id": user_id,
+                    "name": f"habit {n}",
+                    "reminder_time": f"{rnd.randrange(24):02d}:{rnd.randrange(60):02d}",
+                    "is_active": True,
+                    "completion_count": 0,
+                    "streak": 0,
+                })
+                if len(rows) >= batch:
+                    conn.execute(insert(models.Habit), rows)
+                    rows = []
+        if rows:
+            conn.execute(insert(models.Habit), rows)
+    engine.dispose()
+
+
+@contextlib.contextmanager
+def run_uvicorn(app: str, env: Optional[Dict[str, str]] = None, workers: int = 1, ready_path: str = "/docs"):
+    """Запускает ASGI-приложение в отдельном процессе uvicorn и отдаёт его базовый URL"""
+    port = free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", app,
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning",
+        ],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **(env or {})},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"uvicorn завершился с кодом {process.returncode}")
+            try:
+                httpx.get(f"{base_url}{ready_path}", timeout=1.0)
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn не запустился за 60 с")
+                time.sleep(0.2)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+@contextlib.contextmanager
+def run_server(
+        database_url: str,
+        env: Optional[Dict[str, str]] = None,
+        workers: int = 1,
+        app: str = "app.main:app"
+):
+    """Запускает backend в отдельном процессе uvicorn и отдаёт его базовый URL"""
+    server_env = {
+        "DATABASE_URL": database_url,
+        "TELEGRAM_BOT_TOKEN": os.getenv("TELEGRAM_BOT_TOKEN", "123456:benchmark"),
+        **(env or {}),
+    }
+    with run_uvicorn(app, server_env, workers=workers) as base_url:
+        yield base_url
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+async def drive(
+        client: httpx.AsyncClient,
+        make_request: Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]],
+        concurrency: int,
+        duration: float
+) -> dict:
+    """Держит concurrency одновременных запросов в течение duration секунд"""
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def user(seed_value: int):
+        nonlocal errors
+        rnd = random.Random(seed_value)
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await make_request(client, rnd)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
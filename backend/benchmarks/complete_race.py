@@ -0,0 +1,96 @@
+"""Одновременные отметки одной привычки: ни одна не должна потеряться.
+
+Поднимает backend с --workers процессами uvicorn и шлёт --requests отметок одной
+привычки из --clients одновременных клиентов, половину — через POST /habits/{id}/complete,
+половину — через POST /habits/complete. В конце сверяет completion_count привычки
+и число строк журнала с числом успешных ответов (streak за один день — 1) и печатает итог и задержки.
+Код возврата 1 — счётчик разошёлся с числом успешных отметок.
+
+Запуск из каталога backend (Postgres или временная SQLite):
+    python -m benchmarks.complete_race --requests 500 --clients 50 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import httpx
+from sqlalchemy import create_engine, text
+
+from benchmarks.common import run_server, seed, summarize, telegram_id, temp_sqlite_url
+
+HABIT_ID = 1
+
+
+async def hammer(base_url: str, args) -> dict:
+    latencies = []
+    statuses = {}
+    queue = asyncio.Queue()
+    for i in range(args.requests):
+        queue.put_nowait(i)
+
+    async def client_loop(client: httpx.AsyncClient):
+        while not queue.empty():
+            i = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                if i % 2:
+                    response = await client.post(
+                        "/habits/complete", json={"telegram_id": telegram_id(1), "habit_ids": [HABIT_ID]}
+                    )
+                    ok = response.status_code == 200 and response.json()["results"][0]["status"] == "completed"
+                else:
+                    response = await client.post(f"/habits/{HABIT_ID}/complete", json={"telegram_id": telegram_id(1)})
+                    ok = response.status_code == 200
+                key = "ok" if ok else str(response.status_code)
+            except httpx.HTTPError as e:
+                key = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[key] = statuses.get(key, 0) + 1
+
+    limits = httpx.Limits(max_connections=args.clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(args.clients)))
+        elapsed = time.perf_counter() - started
+    return {"responses": statuses, "latency": summarize(latencies, args.requests - statuses.get("ok", 0), elapsed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="по умолчанию — временная SQLite")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4, help="процессов uvicorn")
+    args = parser.parse_args()
+
+    database_url = args.database_url or temp_sqlite_url()
+    seed(database_url, users=1, habits_per_user=1)
+    with run_server(database_url, {"OUTBOX_WORKERS": "0"}, workers=args.workers) as base_url:
+        result = asyncio.run(hammer(base_url, args))
+
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        completion_count, streak = conn.execute(
+            text("SELECT completion_count, streak FROM habits WHERE id = :id"), {"id": HABIT_ID}
+        ).one()
+        journal = conn.execute(
+            text("SELECT count(*) FROM habit_completions WHERE habit_id = :id"), {"id": HABIT_ID}
+        ).scalar()
+    engine.dispose()
+
+    succeeded = result["responses"].get("ok", 0)
+    result.update({
+        "succeeded": succeeded,
+        "completion_count": completion_count,
+        "journal_rows": journal,
+        "streak": streak,
+        "lost_updates": succeeded - completion_count,
+    })
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if completion_count == succeeded == journal else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Заглушка backend для прогонов бота: только маршруты входа и списка привычек.
+
+Каждый ответ задерживается на FAKE_BACKEND_LATENCY_MS — так медленный backend
+видно в пропускной способности бота, а не в CPU bcrypt и БД.
+
+Запуск:
+    FAKE_BACKEND_LATENCY_MS=100 python -m uvicorn benchmarks.fake_backend:app --port 8000
+"""
+import asyncio
+import os
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+LATENCY = float(os.getenv("FAKE_BACKEND_LATENCY_MS", "50")) / 1000
+
+
+async def token(request: Request):
+    await asyncio.sleep(LATENCY)
+    form = await request.form()
+    return JSONResponse({"access_token": f"token-{form['username']}", "token_type": "bearer"})
+
+
+async def link_telegram(request: Request):
+    await asyncio.sleep(LATENCY)
+    data = await request.json()
+    return JSONResponse({"username": request.path_params["username"], "telegram_id": data["telegram_id"]})
+
+
+async def habits(request: Request):
+    await asyncio.sleep(LATENCY)
+    telegram_id = int(request.query_params["telegram_id"])
+    return JSONResponse([
+        {"id": telegram_id * 10 + i, "name": f"habit {i}", "reminder_time": "09:00", "is_active": True,
+         "completion_count": 0, "current_streak": 0, "telegram_id": telegram_id}
+        for i in range(3)
+    ])
+
+
+async def health(request: Request):
+    return JSONResponse({"ok": True})
+
+
+app = Starlette(routes=[
+    Route("/token", token, methods=["POST"]),
+    Route("/users/{username}/link_telegram", link_telegram, methods=["PUT"]),
+    Route("/habits/", habits),
+    Route("/_health", health),
+])
@@ -0,0 +1,210 @@
+"""Локальная замена Telegram Bot API для офлайн-прогонов backend и бота.
+
+Реализует методы, которыми пользуемся: getMe, sendMessage, editMessageText,
+editMessageReplyMarkup, answerCallbackQuery, getUpdates, deleteWebhook.
+Задержка ответа и ошибки 429/400/502 настраиваются переменными окружения или POST /_config.
+
+Запуск:
+    FAKE_TG_LATENCY_MS=50 FAKE_TG_429_PERCENT=1 python -m uvicorn benchmarks.fake_telegram:app --port 8081
+и TELEGRAM_API_URL=http://127.0.0.1:8081 для backend и бота.
+
+Служебные маршруты:
+    GET  /_stats    счётчики по методам, время получения и текст каждого sendMessage
+    POST /_reset    обнулить счётчики
+    POST /_config   {"latency_ms": .., "jitter_ms": .., "error_429_percent": .., ...}
+    POST /_updates  положить update в очередь getUpdates (для проверки хендлеров бота)
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter, deque
+from typing import Any, Dict, List
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+BOT_USER = {"id": 1000001, "is_bot": True, "first_name": "Fake", "username": "fake_habits_bot"}
+
+
+class FakeTelegram:
+    def __init__(self):
+        self.config = {
+            "latency_ms": float(os.getenv("FAKE_TG_LATENCY_MS", "30")),
+            "jitter_ms": float(os.getenv("FAKE_TG_JITTER_MS", "10")),
+            # доля случайных 429 и 400 для отправки и редактирования сообщений, в процентах
+            "error_429_percent": float(os.getenv("FAKE_TG_429_PERCENT", "0")),
+            "error_400_percent": float(os.getenv("FAKE_TG_400_PERCENT", "0")),
+            # 502 клиент Telegram считает сетевой ошибкой
+            "error_502_percent": float(os.getenv("FAKE_TG_502_PERCENT", "0")),
+            "retry_after": int(os.getenv("FAKE_TG_RETRY_AFTER", "1")),
+            # 429 при превышении общего числа отправок в секунду, как у настоящего Telegram; 0 — без лимита
+            "max_rps": float(os.getenv("FAKE_TG_MAX_RPS", "0")),
+        }
+        self.random = random.Random(int(os.getenv("FAKE_TG_SEED", "0")))
+        self.reset()
+
+    def reset(self):
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.received: List[List[Any]] = []
+        self.texts: Dict[int, List[str]] = {}
+        self.message_id = 0
+        self.updates: List[dict] = []
+        self.update_id = 0
+        self.updates_ready = asyncio.Event()
+        self._window: deque = deque()
+
+    def stats(self) -> dict:
+        return {
+            "calls": dict(self.calls),
+            "errors": dict(self.errors),
+            "delivered": len(self.received),
+            # [chat_id, время получения по time.time()]
+            "received": self.received,
+            # chat_id -> тексты отправленных сообщений по порядку
+            "texts": self.texts,
+        }
+
+    def _rate_limited(self, now: float) -> bool:
+        if not self.config["max_rps"]:
+            return False
+        while self._window and self._window[0] <= now - 1:
+            self._window.popleft()
+        if len(self._window) >= self.config["max_rps"]:
+            return True
+        self._window.append(now)
+        return False
+
+    def injected_error(self, method: str):
+        if method not in ("sendMessage", "editMessageText", "editMessageReplyMarkup"):
+            return None
+        roll = self.random.random() * 100
+        if roll < self.config["error_429_percent"] or self._rate_limited(time.monotonic()):
+            self.errors["429"] += 1
+            retry_after = self.config["retry_after"]
+            return JSONResponse({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }, status_code=429)
+        if roll < self.config["error_429_percent"] + self.config["error_400_percent"]:
+            self.errors["400"] += 1
+            return JSONResponse(
+                {"ok": False, "error_code": 400, "description": "Bad Request: chat not found"},
+                status_code=400
+            )
+        if roll < sum(self.config[key] for key in ("error_429_percent", "error_400_percent", "error_502_percent")):
+            self.errors["502"] += 1
+            return JSONResponse({"ok": False, "error_code": 502, "description": "Bad Gateway"}, status_code=502)
+        return None
+
+    def message(self, params: dict) -> dict:
+        self.message_id += 1
+        chat_id = int(params.get("chat_id", 0))
+        return {
+            "message_id": int(params.get("message_id", self.message_id)),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+
+    async def get_updates(self, params: dict) -> list:
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        if not self.updates and timeout:
+            self.updates_ready.clear()
+            try:
+                await asyncio.wait_for(self.updates_ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.updates[:int(params.get("limit") or 100)]
+
+    def push_update(self, update: dict) -> dict:
+        self.update_id += 1
+        update = {**update, "update_id": self.update_id}
+        self.updates.append(update)
+        self.updates_ready.set()
+        return update
+
+
+fake = FakeTelegram()
+
+
+async def read_params(request: Request) -> Dict[str, Any]:
+    """PTB шлёт параметры формой со значениями в JSON, другие клиенты — JSON-телом"""
+    if request.headers.get("content-type", "").startswith("application/json"):
+        return await request.json()
+    params = dict(await request.form()) if request.method == "POST" else {}
+    params.update(request.query_params)
+    for key, value in params.items():
+        if isinstance(value, str):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                pass
+    return params
+
+
+async def bot_method(request: Request):
+    method = request.path_params["method"]
+    params = await read_params(request)
+    fake.calls[method] += 1
+
+    delay = fake.config["latency_ms"] + fake.random.uniform(-1, 1) * fake.config["jitter_ms"]
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+
+    error = fake.injected_error(method)
+    if error is not None:
+        return error
+
+    if method == "getMe":
+        result = BOT_USER
+    elif method == "sendMessage":
+        chat_id = int(params.get("chat_id", 0))
+        fake.received.append([chat_id, time.time()])
+        fake.texts.setdefault(chat_id, []).append(params.get("text", ""))
+        result = fake.message(params)
+    elif method in ("editMessageText", "editMessageReplyMarkup"):
+        result = fake.message(params)
+    elif method in ("answerCallbackQuery", "deleteWebhook", "setWebhook", "setMyCommands"):
+        result = True
+    elif method == "getUpdates":
+        result = await fake.get_updates(params)
+    else:
+        return JSONResponse({"ok": False, "error_code": 404, "description": "Not Found"}, status_code=404)
+    return JSONResponse({"ok": True, "result": result})
+
+
+async def stats(request: Request):
+    return JSONResponse(fake.stats())
+
+
+async def reset(request: Request):
+    fake.reset()
+    return JSONResponse({"ok": True})
+
+
+async def configure(request: Request):
+    fake.config.update(await request.json())
+    return JSONResponse(fake.config)
+
+
+async def push_update(request: Request):
+    return JSONResponse(fake.push_update(await request.json()))
+
+
+app = Starlette(routes=[
+    Route("/bot{token}/{method}", bot_method, methods=["GET", "POST"]),
+    Route("/_stats", stats),
+    Route("/_reset", reset, methods=["POST"]),
+    Route("/_config", configure, methods=["POST"]),
+    Route("/_updates", push_update, methods=["POST"]),
+])
@@ -0,0 +1,79 @@
+"""Задержка страницы списка привычек: OFFSET/LIMIT против курсора по id.
+
+Для каждого размера списка пользователь листает все страницы; печатается время
+первой, средней и последней страницы. С курсором время не должно расти с номером страницы.
+
+Запуск из каталога backend:
+    python -m benchmarks.habit_pages --sizes 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks.common import percentile, seed, temp_sqlite_url
+
+
+def legacy_page(db, user_id: int, skip: int, limit: int):
+    from app import models
+    return db.query(models.Habit).filter(
+        models.Habit.user_id == user_id,
+        models.Habit.is_active == True
+    ).offset(skip).limit(limit).all()
+
+
+def walk(db, user_id: int, page_size: int, keyset: bool) -> list:
+    from app import crud
+
+    timings = []
+    after_id, skip = None, 0
+    while True:
+        started = time.perf_counter()
+        if keyset:
+            page = crud.get_habits(db, user_id=user_id, after_id=after_id, limit=page_size)
+        else:
+            page = legacy_page(db, user_id, skip, page_size)
+        timings.append(time.perf_counter() - started)
+        db.expunge_all()
+        if len(page) < page_size:
+            return timings
+        after_id, skip = page[-1].id, skip + page_size
+
+
+def bench_size(habits: int, page_size: int, database_url: str) -> dict:
+    # пользователь 2 — тот, чей список листаем; соседи делят с ним индекс
+    seed(database_url, users=3, habits_per_user=habits)
+    from app.database import SessionLocal
+
+    result = {"habits": habits, "pages": 0}
+    db = SessionLocal()
+    try:
+        for name, keyset in (("offset", False), ("keyset", True)):
+            timings = walk(db, user_id=2, page_size=page_size, keyset=keyset)
+            result["pages"] = len(timings)
+            result[name] = {
+                "first_ms": round(timings[0] * 1000, 3),
+                "middle_ms": round(timings[len(timings) // 2] * 1000, 3),
+                "last_ms": round(timings[-1] * 1000, 3),
+                "p95_ms": round(percentile(timings, 95) * 1000, 3),
+            }
+    finally:
+        db.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="по умолчанию — временная SQLite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    database_url = args.database_url or temp_sqlite_url()
+    os.environ["DATABASE_URL"] = database_url
+    results = [bench_size(size, args.page_size, database_url) for size in args.sizes]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Нагрузочный тест всех эндпоинтов backend с разбивкой по маршрутам.
+
+Поднимает backend (uvicorn, заглушка вместо отправщика Telegram) на локальной БД,
+наполняет её и держит --concurrency виртуальных пользователей, каждый выбирает
+операцию по весам --mix. Результат — JSON с rps и p50/p95/p99 по каждому маршруту.
+
+Запуск из каталога backend:
+    python -m benchmarks.load_test --users 1000 --duration 30 --output before.json
+    python -m benchmarks.load_test --users 1000 --duration 30 --baseline before.json
+С --database-url можно указать одноразовую локальную Postgres; по умолчанию — временная SQLite.
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.common import BACKEND_DIR, PASSWORD, run_server, seed, summarize, telegram_id, temp_sqlite_url
+
+DEFAULT_MIX = "list=40,list_cached=15,complete=20,complete_bulk=5,update=10,create_delete=5,login=5"
+
+
+class VirtualUser:
+    """Пользователь бенчмарка: свои привычки, ETag списка и созданные им привычки"""
+
+    def __init__(self, index: int, habits_per_user: int, rnd: random.Random):
+        self.index = index
+        self.telegram_id = telegram_id(index)
+        first = (index - 1) * habits_per_user + 1
+        self.habit_ids = list(range(first, first + habits_per_user))
+        self.rnd = rnd
+        self.etag = None
+        self.created: List[int] = []
+        self.serial = 0
+
+
+async def op_list(client: httpx.AsyncClient, user: VirtualUser):
+    response = await client.get("/habits/", params={"telegram_id": user.telegram_id})
+    user.etag = response.headers.get("ETag")
+    return "GET /habits/", response
+
+
+async def op_list_cached(client: httpx.AsyncClient, user: VirtualUser):
+    headers = {"If-None-Match": user.etag} if user.etag else {}
+    response = await client.get("/habits/", params={"telegram_id": user.telegram_id}, headers=headers)
+    user.etag = response.headers.get("ETag", user.etag)
+    return "GET /habits/ (If-None-Match)", response
+
+
+async def op_complete(client: httpx.AsyncClient, user: VirtualUser):
+    habit_id = user.rnd.choice(user.habit_ids)
+    response = await client.post(f"/habits/{habit_id}/complete", json={"telegram_id": user.telegram_id})
+    return "POST /habits/{id}/complete", response
+
+
+async def op_complete_bulk(client: httpx.AsyncClient, user: VirtualUser):
+    habit_ids = user.rnd.sample(user.habit_ids, min(3, len(user.habit_ids)))
+    response = await client.post(
+        "/habits/complete", json={"telegram_id": user.telegram_id, "habit_ids": habit_ids}
+    )
+    return "POST /habits/complete", response
+
+
+async def op_update(client: httpx.AsyncClient, user: VirtualUser):
+    habit_id = user.rnd.choice(user.habit_ids)
+    reminder_time = f"{user.rnd.randrange(24):02d}:{user.rnd.randrange(60):02d}"
+    response = await client.put(f"/habits/{habit_id}", json={"reminder_time": reminder_time})
+    return "PUT /habits/{id}", response
+
+
+async def op_create_delete(client: httpx.AsyncClient, user: VirtualUser):
+    # чередование держит число привычек пользователя постоянным
+    if user.created:
+        habit_id = user.created.pop()
+        response = await client.delete(f"/habits/{habit_id}", params={"telegram_id": user.telegram_id})
+        return "DELETE /habits/{id}", response
+    user.serial += 1
+    response = await client.post("/habits/", json={
+        "telegram_id": user.telegram_id,
+        "name": f"load {user.index}-{user.serial}-{user.rnd.getrandbits(32)}",
+    })
+    if response.status_code == 201:
+        user.created.append(response.json()["id"])
+    return "POST /habits/", response
+
+
+async def op_login(client: httpx.AsyncClient, user: VirtualUser):
+    response = await client.post("/token", data={"username": f"user{user.index}", "password": PASSWORD})
+    return "POST /token", response
+
+
+OPERATIONS = {
+    "list": op_list,
+    "list_cached": op_list_cached,
+    "complete": op_complete,
+    "complete_bulk": op_complete_bulk,
+    "update": op_update,
+    "create_delete": op_create_delete,
+    "login": op_login,
+}
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise SystemExit(f"Неизвестная операция {name!r}, доступны: {', '.join(OPERATIONS)}")
+        weights[name] = int(weight or 1)
+    return weights
+
+
+async def run_load(base_url: str, args) -> dict:
+    weights = parse_mix(args.mix)
+    names, cum_weights = list(weights), []
+    for weight in weights.values():
+        cum_weights.append((cum_weights[-1] if cum_weights else 0) + weight)
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        async def worker(seed_value: int, deadline: float, record: bool):
+            rnd = random.Random(seed_value)
+            user = VirtualUser(rnd.randint(1, args.users), args.habits_per_user, rnd)
+            while time.perf_counter() < deadline:
+                operation = OPERATIONS[rnd.choices(names, cum_weights=cum_weights)[0]]
+                started = time.perf_counter()
+                try:
+                    route, response = await operation(client, user)
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    route, failed = operation.__name__, True
+                if record:
+                    latencies[route].append(time.perf_counter() - started)
+                    errors[route] += failed
+
+        if args.warmup:
+            deadline = time.perf_counter() + args.warmup
+            # свои зёрна у прогрева, иначе замер повторит его имена привычек
+            await asyncio.gather(*(
+                worker(args.concurrency + i, deadline, False) for i in range(args.concurrency)
+            ))
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(worker(i, deadline, True) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "total": summarize(all_latencies, sum(errors.values()), elapsed),
+        "routes": {
+            route: summarize(values, errors[route], elapsed)
+            for route, values in sorted(latencies.items())
+        },
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(result: dict, baseline: dict) -> dict:
+    """Изменение rps и p95 по маршрутам относительно прошлого прогона, в процентах"""
+    def delta(new, old):
+        return round((new - old) / old * 100, 1) if old else None
+
+    diff = {}
+    for route, stats in result["routes"].items():
+        old = baseline.get("routes", {}).get(route)
+        if old:
+            diff[route] = {
+                "rps_pct": delta(stats["rps"], old["rps"]),
+                "p95_pct": delta(stats["p95_ms"], old["p95_ms"]),
+            }
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="по умолчанию — временная SQLite")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--habits-per-user", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"веса операций, по умолчанию {DEFAULT_MIX}")
+    parser.add_argument("--workers", type=int, default=1, help="процессов uvicorn")
+    parser.add_argument("--db-mode", choices=("sync", "async"), default="sync")
+    parser.add_argument("--output", default=None, help="сохранить результат в файл")
+    parser.add_argument("--baseline", default=None, help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    database_url = args.database_url or temp_sqlite_url()
+    seed(database_url, args.users, args.habits_per_user)
+    env = {"DB_MODE": args.db_mode}
+    with run_server(database_url, env, workers=args.workers, app="benchmarks.stub_app:app") as base_url:
+        result = asyncio.run(run_load(base_url, args))
+
+    result = {
+        "revision": git_revision(),
+        "config": {
+            key: getattr(args, key)
+            for key in ("users", "habits_per_user", "concurrency", "duration", "mix", "workers", "db_mode")
+        },
+        **result,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            result["vs_baseline"] = compare(result, json.load(f))
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
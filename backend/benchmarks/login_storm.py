@@ -0,0 +1,58 @@
+"""Задержка обычных эндпоинтов во время волны логинов (например, после перезапуска бота).
+
+Сначала меряется GET /habits/ без нагрузки, затем тот же поток чтений
+параллельно с concurrency-логинами на POST /token.
+
+Запуск из каталога backend:
+    python -m benchmarks.login_storm --logins 50 --duration 10
+"""
+import argparse
+import asyncio
+import json
+
+import httpx
+
+from benchmarks.common import drive, run_server, seed, telegram_id, temp_sqlite_url
+
+
+async def read_habits(client: httpx.AsyncClient, rnd, users: int):
+    user = rnd.randint(1, users)
+    return await client.get("/habits/", params={"telegram_id": telegram_id(user)})
+
+
+async def login(client: httpx.AsyncClient, rnd, users: int):
+    user = rnd.randint(1, users)
+    return await client.post("/token", data={"username": f"user{user}", "password": "benchmark"})
+
+
+async def bench(base_url: str, args) -> dict:
+    limits = httpx.Limits(max_connections=args.readers + args.logins)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        reads = lambda c, rnd: read_habits(c, rnd, args.users)
+        logins = lambda c, rnd: login(c, rnd, args.users)
+        baseline = await drive(client, reads, args.readers, args.duration)
+        under_storm, storm = await asyncio.gather(
+            drive(client, reads, args.readers, args.duration),
+            drive(client, logins, args.logins, args.duration),
+        )
+    return {"reads_baseline": baseline, "reads_during_storm": under_storm, "logins": storm}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None, help="по умолчанию — временная SQLite")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--readers", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    database_url = args.database_url or temp_sqlite_url()
+    seed(database_url, args.users, 5)
+    with run_server(database_url, {}) as base_url:
+        result = asyncio.run(bench(base_url, args))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
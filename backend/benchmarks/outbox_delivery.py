@@ -0,0 +1,191 @@
+"""Доставка напоминаний через reminder_outbox: пропускная способность и «хотя бы один раз».
+
+В outbox заранее кладётся --messages сообщений (каждое — в свой чат, текст содержит номер),
+затем --processes процессов с OUTBOX_WORKERS воркерами разбирают его против
+benchmarks.fake_telegram. Для каждого числа воркеров печатается время до последней
+доставки, сообщений в секунду, сколько сообщений дошло, сколько пришло дважды,
+сколько так и не дошло и сколько попыток ушло на 429 и 502.
+
+С --kill-after первый процесс убивается (SIGKILL) после стольких доставок и через секунду
+поднимается заново: забранные им пачки должен дослать кто-то другой после OUTBOX_CLAIM_SECONDS.
+
+Запуск из каталога backend:
+    python -m benchmarks.outbox_delivery --messages 2000 --workers 1 4 16
+    python -m benchmarks.outbox_delivery --messages 2000 --workers 8 --processes 2 \\
+        --error-429-percent 5 --error-502-percent 5 --kill-after 500
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+import httpx
+from sqlalchemy import create_engine, func, insert, select
+
+from benchmarks.common import BACKEND_DIR, run_uvicorn, telegram_id, temp_sqlite_url
+
+
+def seed_outbox(database_url: str, messages: int):
+    os.environ.setdefault("DATABASE_URL", database_url)
+    from app import models
+
+    engine = create_engine(database_url)
+    models.Base.metadata.create_all(bind=engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(models.ReminderOutbox), [
+            {
+                "dedup_key": f"benchmark:{i}",
+                "chat_id": telegram_id(i),
+                "text": f"reminder {i}",
+                "status": "pending",
+                "attempts": 0,
+                "available_at": now,
+                "created_at": now,
+            }
+            for i in range(1, messages + 1)
+        ])
+    engine.dispose()
+
+
+def outbox_state(database_url: str) -> dict:
+    from app import models
+
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        statuses = dict(conn.execute(
+            select(models.ReminderOutbox.status, func.count()).group_by(models.ReminderOutbox.status)
+        ).all())
+        attempts = conn.execute(select(func.sum(models.ReminderOutbox.attempts))).scalar() or 0
+    engine.dispose()
+    return {"statuses": statuses, "attempts": attempts}
+
+
+def start_drainer(env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.outbox_delivery", "--drain"],
+        cwd=BACKEND_DIR, env={**os.environ, **env}
+    )
+
+
+async def drain():
+    """Процесс-разборщик: те же TelegramSender и OutboxDispatcher, что в backend"""
+    logging.basicConfig(level=logging.ERROR)
+    from app.services.outbox import OUTBOX_WORKERS, OutboxDispatcher
+    from app.services.telegram_sender import TelegramSender
+
+    sender = TelegramSender(os.getenv("TELEGRAM_BOT_TOKEN", "123456:benchmark"), pool_size=max(OUTBOX_WORKERS, 1))
+    await sender.start()
+    outbox = OutboxDispatcher(sender)
+    outbox.start()
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    await stop.wait()
+    await outbox.stop()
+    await sender.stop()
+
+
+def run_once(telegram_url: str, workers: int, args) -> dict:
+    database_url = temp_sqlite_url()
+    seed_outbox(database_url, args.messages)
+    httpx.post(f"{telegram_url}/_reset")
+    env = {
+        "DATABASE_URL": database_url,
+        "TELEGRAM_API_URL": telegram_url,
+        "TELEGRAM_GLOBAL_RATE": str(args.global_rate),
+        "OUTBOX_WORKERS": str(workers),
+        "OUTBOX_BATCH_SIZE": str(args.batch_size),
+        "OUTBOX_CLAIM_SECONDS": str(args.claim_seconds),
+        "OUTBOX_BACKOFF_MAX": "2",
+    }
+
+    def delivered() -> int:
+        return httpx.get(f"{telegram_url}/_stats").json()["delivered"]
+
+    started = time.perf_counter()
+    drainers = [start_drainer(env) for _ in range(args.processes)]
+    killed = False
+    try:
+        deadline = started + args.timeout
+        while time.perf_counter() < deadline:
+            if args.kill_after and not killed and delivered() >= args.kill_after:
+                drainers[0].send_signal(signal.SIGKILL)
+                drainers[0].wait()
+                killed = True
+                time.sleep(1)
+                drainers[0] = start_drainer(env)
+            statuses = outbox_state(database_url)["statuses"]
+            if not statuses.get("pending") and not statuses.get("sending"):
+                break
+            time.sleep(0.2)
+        elapsed = time.perf_counter() - started
+    finally:
+        for drainer in drainers:
+            drainer.terminate()
+        for drainer in drainers:
+            try:
+                drainer.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                drainer.kill()
+
+    stats = httpx.get(f"{telegram_url}/_stats").json()
+    state = outbox_state(database_url)
+    copies = Counter(text for texts in stats["texts"].values() for text in texts)
+    return {
+        "workers": workers,
+        "processes": args.processes,
+        "messages": args.messages,
+        "seconds": round(elapsed, 3),
+        "per_s": round(stats["delivered"] / elapsed, 1) if elapsed else 0.0,
+        "delivered_unique": len(copies),
+        "duplicates": sum(n - 1 for n in copies.values()),
+        "never_delivered": args.messages - len(copies),
+        "outbox": state["statuses"],
+        "attempts": state["attempts"],
+        "429": stats["errors"].get("429", 0),
+        "502": stats["errors"].get("502", 0),
+        "killed_process": killed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drain", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--claim-seconds", type=float, default=5.0)
+    parser.add_argument("--global-rate", type=float, default=1000.0)
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="задержка ответа fake Telegram")
+    parser.add_argument("--error-429-percent", type=float, default=0.0)
+    parser.add_argument("--error-502-percent", type=float, default=0.0)
+    parser.add_argument("--kill-after", type=int, default=0, help="убить первый процесс после стольких доставок")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    if args.drain:
+        asyncio.run(drain())
+        return
+
+    fake_env = {
+        "FAKE_TG_LATENCY_MS": str(args.latency_ms),
+        "FAKE_TG_JITTER_MS": "5",
+        "FAKE_TG_429_PERCENT": str(args.error_429_percent),
+        "FAKE_TG_502_PERCENT": str(args.error_502_percent),
+        "FAKE_TG_RETRY_AFTER": "1",
+    }
+    with run_uvicorn("benchmarks.fake_telegram:app", fake_env, ready_path="/_stats") as telegram_url:
+        results = [run_once(telegram_url, workers, args) for workers in args.workers]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
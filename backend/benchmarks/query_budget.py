@@ -0,0 +1,149 @@
+"""Бюджет запросов к БД по маршрутам: лишний запрос или N+1 даёт код возврата 1.
+
+Поднимает backend с DB_QUERY_HEADERS=1 и проходит по всем маршрутам с БД, читая число
+запросов из заголовка X-DB-Queries. Маршрут не должен выходить за свой бюджет из BUDGETS,
+а варианты одного маршрута (страница из 5 и из 50 привычек, отметка одной и 50 привычек)
+должны давать одинаковое число запросов — иначе число запросов растёт с размером данных.
+Кэш пользователей перед проверкой прогрет, как у работающего backend.
+
+Запуск из каталога backend:
+    python -m benchmarks.query_budget
+    python -m benchmarks.query_budget --modes sync async --habits 50
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.common import PASSWORD, run_server, seed, telegram_id, temp_sqlite_url
+
+# маршрут -> наибольшее допустимое число запросов при прогретом кэше пользователей;
+# изменения расписания включают INSERT в журнал schedule_changes
+BUDGETS = {
+    "POST /users/": 3,
+    "POST /token": 1,
+    "GET /users/me/": 1,
+    "PUT /users/{username}/link_telegram": 3,
+    "GET /users/digest": 1,
+    "PUT /users/digest": 4,
+    "POST /habits/": 3,
+    "GET /habits/": 2,
+    "GET /habits/ 304": 1,
+    "POST /habits/complete": 3,
+    "POST /habits/{habit_id}/complete": 3,
+    "POST /habits/{habit_id}/complete?include_habits": 4,
+    "POST /habits/{habit_id}/complete 403": 2,
+    "GET /habits/{habit_id}/completions": 2,
+    "PUT /habits/{habit_id}": 5,
+    "DELETE /habits/{habit_id}": 4,
+    "DELETE /habits/{habit_id} 403": 2,
+}
+
+
+def exercise(client: httpx.Client, habits: int) -> Dict[str, List[httpx.Response]]:
+    """Запросы ко всем маршрутам; варианты одного маршрута различаются только объёмом данных"""
+    calls: Dict[str, List[httpx.Response]] = {}
+    owner = {"telegram_id": telegram_id(1)}
+    stranger = {"telegram_id": telegram_id(2)}
+    first_habit, last_habit = 1, habits
+
+    def call(route: str, method: str, url: str, expected: int = 200, **kwargs) -> httpx.Response:
+        response = client.request(method, url, **kwargs)
+        if response.status_code != expected:
+            raise RuntimeError(f"{route}: {response.status_code} {response.text[:200]}")
+        calls.setdefault(route, []).append(response)
+        return response
+
+    # прогрев: пользователи попадают в кэш, как после первых запросов бота
+    for params in (owner, stranger):
+        client.get("/users/digest", params=params).raise_for_status()
+
+    call("POST /users/", "POST", "/users/", json={"username": "budget", "password": PASSWORD})
+    token = call("POST /token", "POST", "/token", data={"username": "user1", "password": PASSWORD}).json()
+    auth = {"Authorization": f"Bearer {token['access_token']}"}
+    call("GET /users/me/", "GET", "/users/me/", headers=auth)
+    call("PUT /users/{username}/link_telegram", "PUT", "/users/user1/link_telegram",
+         json=owner, headers=auth)
+    client.get("/users/digest", params=owner).raise_for_status()
+
+    call("GET /users/digest", "GET", "/users/digest", params=owner)
+    call("PUT /users/digest", "PUT", "/users/digest", json={**owner, "times": ["09:00"]})
+    call("PUT /users/digest", "PUT", "/users/digest", json={**owner, "times": []})
+
+    call("POST /habits/", "POST", "/habits/", expected=201,
+         json={**owner, "name": "budget habit", "reminder_time": "08:30"})
+
+    page = None
+    for limit in (5, habits):
+        page = call("GET /habits/", "GET", "/habits/", params={**owner, "limit": limit})
+    call("GET /habits/ 304", "GET", "/habits/", expected=304,
+         params={**owner, "limit": habits}, headers={"If-None-Match": page.headers["ETag"]})
+
+    for habit_ids in ([first_habit], list(range(first_habit, last_habit + 1))):
+        call("POST /habits/complete", "POST", "/habits/complete", json={**owner, "habit_ids": habit_ids})
+    for habit_id in (first_habit, last_habit):
+        call("POST /habits/{habit_id}/complete", "POST", f"/habits/{habit_id}/complete", json=owner)
+        call("POST /habits/{habit_id}/complete?include_habits", "POST", f"/habits/{habit_id}/complete",
+             params={"include_habits": "true"}, json=owner)
+    call("POST /habits/{habit_id}/complete 403", "POST", f"/habits/{first_habit}/complete",
+         expected=403, json=stranger)
+
+    for habit_id in (first_habit, last_habit):
+        call("GET /habits/{habit_id}/completions", "GET", f"/habits/{habit_id}/completions", params=owner)
+    call("PUT /habits/{habit_id}", "PUT", f"/habits/{first_habit}", json={"reminder_time": "07:15"})
+    call("DELETE /habits/{habit_id}", "DELETE", f"/habits/{last_habit}", params=owner)
+    call("DELETE /habits/{habit_id} 403", "DELETE", f"/habits/{first_habit}", expected=403, params=stranger)
+    return calls
+
+
+def check(calls: Dict[str, List[httpx.Response]]) -> dict:
+    report = {}
+    for route, budget in BUDGETS.items():
+        responses = calls.get(route, [])
+        queries = [int(response.headers["X-DB-Queries"]) for response in responses]
+        problems = []
+        if not queries:
+            problems.append("не проверен")
+        elif max(queries) > budget:
+            problems.append(f"больше бюджета {budget}")
+        if len(set(queries)) > 1:
+            problems.append("зависит от объёма данных")
+        report[route] = {
+            "queries": queries,
+            "budget": budget,
+            "db_ms": [float(response.headers["X-DB-Time-Ms"]) for response in responses],
+            "ok": not problems,
+            **({"problems": problems} if problems else {}),
+        }
+    for route in calls.keys() - BUDGETS.keys():
+        report[route] = {"ok": False, "problems": ["нет бюджета в BUDGETS"]}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"], choices=["sync", "async"])
+    parser.add_argument("--habits", type=int, default=50, help="привычек у пользователя")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in args.modes:
+        database_url = temp_sqlite_url()
+        seed(database_url, users=2, habits_per_user=args.habits)
+        env = {"DB_MODE": mode, "DB_QUERY_HEADERS": "1", "OUTBOX_WORKERS": "0"}
+        # один процесс: кэш пользователей, прогретый в exercise, должен быть у всех запросов
+        with run_server(database_url, env) as base_url:
+            with httpx.Client(base_url=base_url, timeout=60.0) as client:
+                results[mode] = check(exercise(client, args.habits))
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    failed = [f"{mode} {route}" for mode, report in results.items() for route, row in report.items() if not row["ok"]]
+    if failed:
+        print("Бюджет запросов нарушен: " + ", ".join(failed), file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Бенчмарк колеса напоминаний против одной задачи APScheduler на привычку.
+
+Запуск из каталога backend:
+    python -m benchmarks.reminder_wheel --habits 100000
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.common import seed, temp_sqlite_url
+
+os.environ.setdefault("DATABASE_URL", temp_sqlite_url())
+
+from app.database import SessionLocal, SQLALCHEMY_DATABASE_URL  # noqa: E402
+from app.services.reminders import ReminderEngine  # noqa: E402
+
+
+def bench_wheel() -> dict:
+    async def noop_send(due):
+        return None
+
+    reminders = ReminderEngine(noop_send)
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        loaded = reminders.rehydrate(db)
+        rehydrate_s = time.perf_counter() - started
+
+        # повторная загрузка под tracemalloc — только для оценки памяти
+        reminders = ReminderEngine(noop_send)
+        tracemalloc.start()
+        reminders.rehydrate(db)
+        resident, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        db.close()
+
+    busiest = max(range(24 * 60), key=lambda minute: len(reminders.wheel.due(minute)))
+    moment = datetime(2025, 1, 1, busiest // 60, busiest % 60, tzinfo=reminders.tz)
+    started = time.perf_counter()
+    fired = asyncio.run(reminders.tick(moment))
+    tick_s = time.perf_counter() - started
+
+    return {
+        "loaded": loaded,
+        "rehydrate_s": round(rehydrate_s, 4),
+        "resident_mb": round(resident / 2 ** 20, 2),
+        "peak_mb": round(peak / 2 ** 20, 2),
+        "busiest_minute_due": fired,
+        "busiest_tick_ms": round(tick_s * 1000, 3),
+    }
+
+
+def bench_apscheduler(habits: int) -> dict:
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.interval import IntervalTrigger
+
+    def send(telegram_id, habit_name):
+        return None
+
+    scheduler = BackgroundScheduler()
+    scheduler.start(paused=True)
+    tracemalloc.start()
+    started = time.perf_counter()
+    for i in range(1, habits + 1):
+        scheduler.add_job(send, trigger=IntervalTrigger(hours=1), args=[i, f"habit {i}"], id=f"habit_{i}")
+    register_s = time.perf_counter() - started
+    resident, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    scheduler.shutdown(wait=False)
+    return {
+        "jobs": habits,
+        "register_s": round(register_s, 4),
+        "resident_mb": round(resident / 2 ** 20, 2),
+        "peak_mb": round(peak / 2 ** 20, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--habits", type=int, default=100_000)
+    parser.add_argument("--habits-per-user", type=int, default=5)
+    parser.add_argument("--baseline-jobs", type=int, default=None,
+                        help="число задач APScheduler для сравнения (по умолчанию = --habits, 0 — пропустить)")
+    args = parser.parse_args()
+
+    seed(SQLALCHEMY_DATABASE_URL, args.habits // args.habits_per_user, args.habits_per_user)
+    result = {"habits": args.habits, "wheel": bench_wheel()}
+    baseline_jobs = args.habits if args.baseline_jobs is None else args.baseline_jobs
+    if baseline_jobs:
+        result["apscheduler"] = bench_apscheduler(baseline_jobs)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
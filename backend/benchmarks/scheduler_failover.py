@@ -0,0 +1,114 @@
+"""Проверка единственного владельца расписания и перехода аренды при падении процесса.
+
+Поднимает --nodes процессов backend на общей SQLite и fake Telegram, раскладывает
+напоминания --users пользователей по следующим --minutes минутам и после первой
+отработанной минуты убивает (SIGKILL) процесс-владелец аренды. В конце печатает,
+сколько напоминаний пришло, сколько дублей и пропусков и какие процессы владели арендой.
+Ожидается ровно одно сообщение на привычку: дубль значит, что рассылали двое,
+пропуск — что новый владелец не догнал минуты, пока аренда истекала.
+
+Запуск из каталога backend (занимает около --minutes + 1 минут):
+    python -m benchmarks.scheduler_failover --nodes 3 --users 300 --minutes 3
+"""
+import argparse
+import contextlib
+import json
+import os
+import signal
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import create_engine, text
+
+from benchmarks.common import run_server, run_uvicorn, seed, temp_sqlite_url
+
+
+def spread_reminders(database_url: str, users: int, minutes: int, tz) -> datetime:
+    """Привычка i напоминает в одну из следующих minutes минут; возвращает первую из них"""
+    first = (datetime.now(tz) + timedelta(minutes=1)).replace(second=0, microsecond=0)
+    engine = create_engine(database_url)
+    with engine.begin() as conn:
+        for offset in range(minutes):
+            moment = first + timedelta(minutes=offset)
+            conn.execute(
+                text("UPDATE habits SET reminder_time = :time WHERE id % :minutes = :offset"),
+                {"time": moment.strftime("%H:%M"), "minutes": minutes, "offset": offset}
+            )
+    engine.dispose()
+    return first
+
+
+def lease_owner(database_url: str):
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        owner = conn.execute(text("SELECT owner FROM scheduler_leases WHERE name = 'scheduler'")).scalar()
+    engine.dispose()
+    return owner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--minutes", type=int, default=3)
+    parser.add_argument("--lease-ttl", type=float, default=5.0)
+    parser.add_argument("--heartbeat", type=float, default=1.0)
+    parser.add_argument("--no-kill", action="store_true", help="не убивать владельца")
+    args = parser.parse_args()
+
+    database_url = temp_sqlite_url()
+    seed(database_url, args.users, habits_per_user=1)
+    from app.services.reminders import REMINDER_TIMEZONE
+    first = spread_reminders(database_url, args.users, args.minutes, REMINDER_TIMEZONE)
+    per_minute = Counter(habit_id % args.minutes for habit_id in range(1, args.users + 1))
+
+    owners = []
+    with contextlib.ExitStack() as stack:
+        telegram_url = stack.enter_context(
+            run_uvicorn("benchmarks.fake_telegram:app", {"FAKE_TG_LATENCY_MS": "5"}, ready_path="/_stats")
+        )
+        env = {
+            "TELEGRAM_API_URL": telegram_url,
+            "TELEGRAM_GLOBAL_RATE": "1000",
+            "SCHEDULER_LEASE_TTL": str(args.lease_ttl),
+            "SCHEDULER_HEARTBEAT": str(args.heartbeat),
+            "REMINDER_RESYNC_SECONDS": "5",
+        }
+        for _ in range(args.nodes):
+            stack.enter_context(run_server(database_url, env))
+
+        def delivered() -> int:
+            return httpx.get(f"{telegram_url}/_stats").json()["delivered"]
+
+        killed = False
+        deadline = first + timedelta(minutes=args.minutes, seconds=args.lease_ttl + 30)
+        while datetime.now(REMINDER_TIMEZONE) < deadline:
+            owner = lease_owner(database_url)
+            if owner and (not owners or owners[-1] != owner):
+                owners.append(owner)
+            # владелец убивается сразу после рассылки первой минуты
+            if not killed and not args.no_kill and owner and delivered() >= per_minute[0]:
+                os.kill(int(owner.split(":")[1]), signal.SIGKILL)
+                killed = True
+            if delivered() >= args.users and datetime.now(REMINDER_TIMEZONE) > first + timedelta(
+                    minutes=args.minutes - 1, seconds=30):
+                break
+            time.sleep(0.5)
+
+        stats = httpx.get(f"{telegram_url}/_stats").json()
+
+    counts = Counter(len(texts) for texts in stats["texts"].values())
+    print(json.dumps({
+        "reminders": args.users,
+        "delivered": stats["delivered"],
+        "duplicates": sum((n - 1) * users for n, users in counts.items() if n > 1),
+        "missing": args.users - len(stats["texts"]),
+        "owners": owners,
+        "killed_owner": killed,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
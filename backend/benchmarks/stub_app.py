@@ -0,0 +1,29 @@
+"""Backend с заглушкой вместо отправщика Telegram: напоминания считаются, но никуда не уходят.
+
+Заглушка подменяет и main.sender, и отправщик в main.outbox: воркеры outbox создаются
+при импорте main и иначе слали бы через настоящий, не запущенный TelegramSender.
+
+    python -m uvicorn benchmarks.stub_app:app
+"""
+from app import main
+
+
+class StubSender:
+    def __init__(self):
+        self.sent = 0
+        self.running = False
+        # Telegram не просит подождать: воркеры outbox не придерживают пачки
+        self.paused_for = 0.0
+
+    async def start(self):
+        self.running = True
+
+    async def stop(self):
+        self.running = False
+
+    async def send(self, message):
+        self.sent += 1
+
+
+main.sender = main.outbox.sender = StubSender()
+app = main.app
@@ -1,7 +1,11 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
-from services.api import create_habit, get_habits, mark_habit_done, create_user, update_habit, delete_habit
+from services.api import (
+    create_habit, get_habits_page, mark_habit_done, mark_habits_done, create_user, update_habit,
+    delete_habit, get_digest, set_digest
+)
 from telegram.error import BadRequest
+import os
 import re
 import logging
 
@@ -9,6 +13,33 @@ import logging
 logger = logging.getLogger(__name__)
 ADD_HABIT_NAME, ADD_HABIT_TIME = range(2)
 TIME_REGEX = re.compile(r'^([0-1]?[0-9]|2[0-3]):[0-5][0-9]$')
+EDIT_FIELDS = {"name": "name", "time": "reminder_time", "active": "is_active"}
+PAGE_SIZE = int(os.getenv("HABITS_PAGE_SIZE", "10"))
+DONE_BUTTON = re.compile(r'^done_\d+$')
+
+
+def page_cursor(data: str):
+    """Курсор из callback_data вида <prefix>page_<cursor>; пустой — первая страница"""
+    return data.split("_", 1)[1] or None
+
+
+def page_buttons(prefix: str, page: dict):
+    """Ряд листания: вперёд по курсору backend и обратно к первой странице"""
+    row = []
+    if page["cursor"]:
+        row.append(InlineKeyboardButton("⏮ В начало", callback_data=f"{prefix}page_"))
+    if page["next_cursor"]:
+        row.append(InlineKeyboardButton("Далее ▶", callback_data=f"{prefix}page_{page['next_cursor']}"))
+    return [row] if row else []
+
+
+def choice_keyboard(prefix: str, page: dict):
+    """Кнопка на каждую привычку страницы с callback_data <prefix>_<id>"""
+    rows = [
+        [InlineKeyboardButton(h["name"], callback_data=f"{prefix}_{h['id']}")]
+        for h in page["habits"]
+    ]
+    return InlineKeyboardMarkup(rows + page_buttons(prefix, page))
 
 
 async def start_add_habit(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -56,42 +87,133 @@ async def save_habit_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
             del context.user_data["habit_name"]
 
     except Exception as e:
-        logger.error(f"Ошибка: {e}", exc_info=True)
+        logger.error("Ошибка: %s", e, exc_info=True)
         await update.message.reply_text("⚠️ Ошибка при создании привычки")
 
     return ConversationHandler.END
 
 
+def list_text(page: dict):
+    return "📋 Ваши привычки:\n" + "\n".join(f"• {h['name']}" for h in page["habits"])
+
+
 async def list_habits(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Вывод списка привычек пользователя"""
     telegram_id = update.message.from_user.id
-    habits = await get_habits(telegram_id)
+    page = await get_habits_page(telegram_id, limit=PAGE_SIZE)
 
-    if not habits or isinstance(habits, dict) and habits.get("status") == "error":
+    if page.get("status") == "error" or not page["habits"]:
         await update.message.reply_text("У вас пока нет привычек!")
         return
 
-    text = "📋 Ваши привычки:\n" + "\n".join(
-        f"{i + 1}. {h['name']}"
-        for i, h in enumerate(habits)
+    await update.message.reply_text(
+        list_text(page), reply_markup=InlineKeyboardMarkup(page_buttons("list", page))
+    )
+
+
+async def list_habits_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    page = await get_habits_page(query.from_user.id, page_cursor(query.data), limit=PAGE_SIZE)
+    if page.get("status") == "error" or not page["habits"]:
+        await query.edit_message_text("У вас пока нет привычек!")
+        return
+    await query.edit_message_text(
+        list_text(page), reply_markup=InlineKeyboardMarkup(page_buttons("list", page))
     )
-    await update.message.reply_text(text)
 
 
 async def mark_habit_done_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /done с клавиатурой"""
     user_id = update.message.from_user.id
-    habits = await get_habits(user_id)
+    page = await get_habits_page(user_id, limit=PAGE_SIZE)
 
-    if not habits:
+    if page.get("status") == "error" or not page["habits"]:
         await update.message.reply_text("У вас нет привычек для отметки!")
         return
 
-    keyboard = InlineKeyboardMarkup([
-        [InlineKeyboardButton(h["name"], callback_data=f"done_{h['id']}")]
-        for h in habits
-    ])
-    await update.message.reply_text("Выберите привычку:", reply_markup=keyboard)
+    context.user_data["done_habits"] = {h["id"]: h["name"] for h in page["habits"]}
+    context.user_data["done_page"] = page
+    context.user_data["done_selected"] = []
+    await update.message.reply_text(
+        "Выберите выполненные привычки и нажмите «Отметить»:",
+        reply_markup=done_keyboard(page, [])
+    )
+
+
+def done_keyboard(page: dict, selected: list):
+    """Клавиатура множественного выбора для /done; выбор сохраняется при листании"""
+    rows = [
+        [InlineKeyboardButton(
+            f"{'✅' if h['id'] in selected else '⬜'} {h['name']}",
+            callback_data=f"done_toggle_{h['id']}"
+        )]
+        for h in page["habits"]
+    ]
+    rows += page_buttons("done", page)
+    rows.append([InlineKeyboardButton(f"Отметить ({len(selected)})", callback_data="done_submit")])
+    return InlineKeyboardMarkup(rows)
+
+
+async def done_habits_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    page = await get_habits_page(query.from_user.id, page_cursor(query.data), limit=PAGE_SIZE)
+    if page.get("status") == "error":
+        await query.edit_message_text(f"❌ {page.get('message')}")
+        return
+
+    context.user_data.setdefault("done_habits", {}).update({h["id"]: h["name"] for h in page["habits"]})
+    context.user_data["done_page"] = page
+    selected = context.user_data.setdefault("done_selected", [])
+    await query.edit_message_reply_markup(reply_markup=done_keyboard(page, selected))
+
+
+async def toggle_done_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выбор привычки без запроса к backend: меняется только клавиатура"""
+    query = update.callback_query
+    await query.answer()
+
+    page = context.user_data.get("done_page")
+    if not page:
+        await query.edit_message_text("Список устарел, вызовите /done ещё раз")
+        return
+
+    habit_id = int(query.data.rsplit("_", 1)[1])
+    selected = context.user_data.setdefault("done_selected", [])
+    if habit_id in selected:
+        selected.remove(habit_id)
+    else:
+        selected.append(habit_id)
+    await query.edit_message_reply_markup(reply_markup=done_keyboard(page, selected))
+
+
+async def submit_done_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    selected = context.user_data.get("done_selected")
+    if not selected:
+        await query.answer("Ничего не выбрано")
+        return
+    await query.answer()
+
+    result = await mark_habits_done(selected, query.from_user.id)
+    if result.get("status") == "error":
+        await query.edit_message_text(f"❌ {result.get('message')}")
+        return
+
+    habits = context.user_data.pop("done_habits", {})
+    context.user_data.pop("done_page", None)
+    context.user_data.pop("done_selected", None)
+    lines = []
+    for item in result["results"]:
+        name = item.get("name") or habits.get(item["habit_id"], item["habit_id"])
+        if item["status"] == "completed":
+            lines.append(f"✅ {name} — серия {item['streak']}")
+        else:
+            lines.append(f"❌ {name} — не удалось отметить")
+    await query.edit_message_text("Отмечено:\n\n" + "\n".join(lines))
 
 
 async def handle_done_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -101,47 +223,91 @@ async def handle_done_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     habit_id = int(query.data.split("_")[1])
     telegram_id = query.from_user.id
 
-    result = await mark_habit_done(habit_id, telegram_id)
+    result = await mark_habit_done(habit_id, telegram_id, include_habits=True)
 
     if result.get("status") == "error":
         await query.edit_message_text(f"❌ {result.get('message')}")
         return
 
-    habits = await get_habits(telegram_id)
     text = "✅ Привычка отмечена!\n\n" + "\n".join(
-        f"{i + 1}. {h['name']}"
-        for i, h in enumerate(habits)
+        f"{i + 1}. {h['name']} — серия {h['streak']}"
+        for i, h in enumerate(result["habits"])
     )
 
-    await query.edit_message_text(text=text)
+    # в сводке остаются кнопки остальных привычек, чтобы отмечать их из того же сообщения
+    markup = query.message.reply_markup if query.message else None
+    remaining = [
+        row for row in (markup.inline_keyboard if markup else ())
+        if row and DONE_BUTTON.match(row[0].callback_data or "") and row[0].callback_data != query.data
+    ]
+    await query.edit_message_text(text=text, reply_markup=InlineKeyboardMarkup(remaining) if remaining else None)
+
+
+async def digest_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/digest 09:00 21:00 — одна сводка в это время вместо напоминания на каждую привычку,
+    /digest off — обратно к отдельным напоминаниям, /digest — текущая настройка"""
+    telegram_id = update.message.from_user.id
+    args = context.args or []
+    if not args:
+        result = await get_digest(telegram_id)
+    elif args == ["off"]:
+        result = await set_digest(telegram_id, [])
+    elif all(TIME_REGEX.match(arg) for arg in args):
+        result = await set_digest(telegram_id, args)
+    else:
+        await update.message.reply_text("❌ Формат: /digest 09:00 21:00 или /digest off")
+        return
+
+    if result.get("status") == "error":
+        await update.message.reply_text("⚠️ Не удалось получить настройки сводки")
+        return
+    if result["times"]:
+        await update.message.reply_text(
+            f"📋 Сводка привычек приходит в {', '.join(result['times'])} вместо отдельных напоминаний.\n"
+            "Отключить: /digest off"
+        )
+    else:
+        await update.message.reply_text(
+            "🔔 Напоминания приходят по каждой привычке отдельно.\n"
+            "Одна сводка в день: /digest 09:00 (можно указать несколько времён)"
+        )
 
 
 async def start_edit_habit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Начало диалога редактирования привычки"""
     try:
         telegram_id = update.message.from_user.id
-        habits = await get_habits(telegram_id, context.user_data.get("token"))
+        page = await get_habits_page(telegram_id, limit=PAGE_SIZE, token=context.user_data.get("token"))
 
-        if not habits or isinstance(habits, dict) and habits.get("status") == "error":
+        if page.get("status") == "error" or not page["habits"]:
             await update.message.reply_text("У вас нет привычек для редактирования!")
             return ConversationHandler.END
 
-        keyboard = [
-            [InlineKeyboardButton(h["name"], callback_data=f"edit_{h['id']}")]
-            for h in habits if isinstance(h, dict)
-        ]
-
         await update.message.reply_text(
             "Выберите привычку для редактирования:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=choice_keyboard("edit", page)
         )
         return "SELECT_FIELD"
     except Exception as e:
-        logger.error(f"Error in start_edit_habit: {e}", exc_info=True)
+        logger.error("Error in start_edit_habit: %s", e, exc_info=True)
         await update.message.reply_text("⚠️ Произошла ошибка")
         return ConversationHandler.END
 
 
+async def edit_habits_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    page = await get_habits_page(
+        query.from_user.id, page_cursor(query.data), limit=PAGE_SIZE, token=context.user_data.get("token")
+    )
+    if page.get("status") == "error" or not page["habits"]:
+        await query.edit_message_text("У вас нет привычек для редактирования!")
+        return ConversationHandler.END
+    await query.edit_message_reply_markup(reply_markup=choice_keyboard("edit", page))
+    return "SELECT_FIELD"
+
+
 async def select_field_to_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -202,7 +368,7 @@ async def save_changes(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return "ENTER_NEW_VALUE"
 
         update_data = {
-            context.user_data["edit_field"]: new_value
+            EDIT_FIELDS[context.user_data["edit_field"]]: new_value
         }
 
         result = await update_habit(
@@ -235,27 +401,36 @@ async def start_delete_habit(update: Update, context: ContextTypes.DEFAULT_TYPE)
     """Начало диалога удаления привычки"""
     try:
         telegram_id = update.message.from_user.id
-        habits = await get_habits(telegram_id, context.user_data.get("token"))
+        page = await get_habits_page(telegram_id, limit=PAGE_SIZE, token=context.user_data.get("token"))
 
-        if not habits or isinstance(habits, dict) and habits.get("status") == "error":
+        if page.get("status") == "error" or not page["habits"]:
             await update.message.reply_text("У вас нет привычек для удаления!")
             return ConversationHandler.END
 
-        keyboard = [
-            [InlineKeyboardButton(h["name"], callback_data=f"delete_{h['id']}")]
-            for h in habits if isinstance(h, dict)
-        ]
-
         await update.message.reply_text(
             "Выберите привычку для удаления:",
-            reply_markup=InlineKeyboardMarkup(keyboard))
+            reply_markup=choice_keyboard("delete", page))
         return "CONFIRM_DELETE"
     except Exception as e:
-        logger.error(f"Error in start_delete_habit: {e}", exc_info=True)
+        logger.error("Error in start_delete_habit: %s", e, exc_info=True)
         await update.message.reply_text("⚠️ Произошла ошибка")
         return ConversationHandler.END
 
 
+async def delete_habits_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    page = await get_habits_page(
+        query.from_user.id, page_cursor(query.data), limit=PAGE_SIZE, token=context.user_data.get("token")
+    )
+    if page.get("status") == "error" or not page["habits"]:
+        await query.edit_message_text("У вас нет привычек для удаления!")
+        return ConversationHandler.END
+    await query.edit_message_reply_markup(reply_markup=choice_keyboard("delete", page))
+    return "CONFIRM_DELETE"
+
+
 async def confirm_delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Подтверждение удаления привычки"""
     query = update.callback_query
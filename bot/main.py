@@ -1,12 +1,18 @@
 import os
-import httpx
 from dotenv import load_dotenv
 from telegram import Update
 from telegram.ext import ContextTypes, Application, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler
 from handlers.habits import start_add_habit, save_habit_name, save_habit_time, list_habits, mark_habit_done_command, \
-    handle_done_callback, execute_delete, confirm_delete, start_delete_habit, save_changes, enter_new_value, select_field_to_edit, start_edit_habit
+    handle_done_callback, toggle_done_selection, submit_done_selection, list_habits_page, done_habits_page, \
+    edit_habits_page, delete_habits_page, \
+    execute_delete, confirm_delete, start_delete_habit, save_changes, enter_new_value, select_field_to_edit, start_edit_habit, \
+    digest_command
 from telegram.error import TelegramError
-from services.api import login_user, BASE_URL, create_user
+from services.api import login_user, create_user, link_telegram
+from services.client import backend
+from services.metrics import HANDLER_ERRORS, MeteredApplication, start_metrics_server
+from services.persistence import BOT_PERSISTENCE_PATH, SQLitePersistence
+from services.updates import PerUserUpdateProcessor
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,13 +23,21 @@ AUTH, MAIN = range(2)
 
 load_dotenv()
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+# polling — бот сам опрашивает getUpdates, webhook — Telegram присылает update на WEBHOOK_URL
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "🔐 Для работы с ботом необходимо:\n"
         "1. Зарегистрироваться: /register\n"
         "2. Войти: /login\n\n"
-        "После этого вы сможете использовать команды: /add, /list, /done, /edit, /delete."
+        "После этого вы сможете использовать команды: /add, /list, /done, /edit, /delete, /digest."
     )
 
 async def register(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -64,19 +78,15 @@ async def authenticate(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "telegram_id": update.message.from_user.id
         })
 
-        async with httpx.AsyncClient(base_url=BASE_URL) as client:
-            response = await client.put(
-                f"/users/{username}/link_telegram",
-                json={"telegram_id": update.message.from_user.id},
-                headers={"Authorization": f"Bearer {token['access_token']}"}
-            )
-            response.raise_for_status()
+        link_result = await link_telegram(username, update.message.from_user.id, token["access_token"])
+        if link_result.get("status") == "error":
+            raise Exception(link_result.get("message"))
 
         await update.message.reply_text("✅ Регистрация и вход выполнены! Telegram привязан.")
         return MAIN
 
     except Exception as e:
-        logger.error(f"Error in authenticate: {e}", exc_info=True)
+        logger.error("Error in authenticate: %s", e, exc_info=True)
         await update.message.reply_text(f"❌ Ошибка: {str(e)}")
         return ConversationHandler.END
 
@@ -87,13 +97,14 @@ async def logout(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
     try:
-        logger.error(f"Error: {context.error}", exc_info=True)
+        logger.error("Error: %s", context.error, exc_info=context.error)
+        HANDLER_ERRORS.labels(context.application.update_label(update)).inc()
         if update and hasattr(update, 'message'):
             await update.message.reply_text("⚠️ Произошла ошибка. Попробуйте позже.")
         elif update and hasattr(update, 'callback_query'):
             await update.callback_query.answer("❌ Ошибка обработки запроса")
     except Exception as e:
-        logger.error(f"Error in error handler: {e}")
+        logger.error("Error in error handler: %s", e)
 
 async def cancel_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.callback_query:
@@ -106,16 +117,45 @@ async def cancel_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
 def protected(handler):
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if "token" not in context.user_data:
-            await update.message.reply_text("⚠️ Сначала выполните /login!")
+            # кнопки (например, «✅» в сводке) нажимают и без сессии: у callback нет update.message
+            if update.callback_query:
+                await update.callback_query.answer("⚠️ Сначала выполните /login!", show_alert=True)
+            elif update.effective_message:
+                await update.effective_message.reply_text("⚠️ Сначала выполните /login!")
             return ConversationHandler.END
         return await handler(update, context)
     return wrapper
 
+async def on_startup(app: Application):
+    await backend.start()
+    start_metrics_server()
+
+
+async def on_shutdown(app: Application):
+    await backend.close()
+
+
 def main():
-    app = Application.builder().token(TOKEN).build()
+    builder = (
+        Application.builder()
+        .application_class(MeteredApplication)
+        .token(TOKEN)
+        .base_url(f"{TELEGRAM_API_URL}/bot")
+        .base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+        .concurrent_updates(PerUserUpdateProcessor())
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    # токены и незаконченные диалоги переживают перезапуск бота
+    persistent = bool(BOT_PERSISTENCE_PATH)
+    if persistent:
+        builder = builder.persistence(SQLitePersistence())
+    app = builder.build()
     app.add_error_handler(error_handler)
 
     auth_conv = ConversationHandler(
+        name="auth",
+        persistent=persistent,
         entry_points=[CommandHandler("register", register),
                       CommandHandler("login", login)],
         states={
@@ -126,6 +166,8 @@ def main():
     )
 
     add_habit_conv = ConversationHandler(
+        name="add_habit",
+        persistent=persistent,
         entry_points=[CommandHandler('add', protected(start_add_habit))],
         states={
             ADD_HABIT_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, protected(save_habit_name))],
@@ -136,9 +178,14 @@ def main():
     )
 
     edit_conv_handler = ConversationHandler(
+        name="edit_habit",
+        persistent=persistent,
         entry_points=[CommandHandler('edit', start_edit_habit)],
         states={
-            "SELECT_FIELD": [CallbackQueryHandler(select_field_to_edit, pattern=r'^edit_\d+$')],
+            "SELECT_FIELD": [
+                CallbackQueryHandler(select_field_to_edit, pattern=r'^edit_\d+$'),
+                CallbackQueryHandler(edit_habits_page, pattern='^editpage_')
+            ],
             "ENTER_NEW_VALUE": [CallbackQueryHandler(enter_new_value, pattern=r'^field_(name|time|active)$')],
             "SAVE_CHANGES": [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, save_changes),
@@ -150,11 +197,14 @@ def main():
     )
 
     delete_conv_handler = ConversationHandler(
+        name="delete_habit",
+        persistent=persistent,
         entry_points=[CommandHandler('delete', start_delete_habit)],
         states={
             "CONFIRM_DELETE": [
                 CallbackQueryHandler(execute_delete, pattern=r'^confirm_(yes|no)$'),
-                CallbackQueryHandler(confirm_delete, pattern=r'^delete_\d+$')
+                CallbackQueryHandler(confirm_delete, pattern=r'^delete_\d+$'),
+                CallbackQueryHandler(delete_habits_page, pattern='^deletepage_')
             ],
         },
         fallbacks=[CommandHandler('cancel', cancel_edit)],
@@ -166,12 +216,28 @@ def main():
     app.add_handler(auth_conv)
     app.add_handler(add_habit_conv)
     app.add_handler(CommandHandler("list", protected(list_habits)))
+    app.add_handler(CallbackQueryHandler(protected(list_habits_page), pattern='^listpage_'))
     app.add_handler(CommandHandler("done", protected(mark_habit_done_command)))
+    app.add_handler(CommandHandler("digest", protected(digest_command)))
     app.add_handler(edit_conv_handler)
     app.add_handler(delete_conv_handler)
-    app.add_handler(CallbackQueryHandler(protected(handle_done_callback), pattern='^done_'))
-
-    app.run_polling()
+    app.add_handler(CallbackQueryHandler(protected(toggle_done_selection), pattern=r'^done_toggle_\d+$'))
+    app.add_handler(CallbackQueryHandler(protected(submit_done_selection), pattern='^done_submit$'))
+    app.add_handler(CallbackQueryHandler(protected(done_habits_page), pattern='^donepage_'))
+    # кнопки /done из сообщений, отправленных до множественного выбора
+    app.add_handler(CallbackQueryHandler(protected(handle_done_callback), pattern=r'^done_\d+$'))
+
+    if BOT_MODE == "webhook":
+        # WEBHOOK_URL — публичный адрес за прокси; путь в нём должен совпадать с WEBHOOK_PATH
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET
+        )
+    else:
+        app.run_polling()
 
 if __name__ == "__main__":
     main()
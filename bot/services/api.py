@@ -1,24 +1,24 @@
-import httpx
-from httpx import ConnectTimeout, ReadTimeout
 import logging
-import json
-
-
-BASE_URL = "http://backend:8000"
+import os
+from collections import OrderedDict
+from services.client import backend
 
 
 logger = logging.getLogger(__name__)
 
+HABITS_CACHE_SIZE = int(os.getenv("HABITS_CACHE_SIZE", "5000"))
+# (telegram_id, cursor, limit) -> (ETag, страница); свежесть проверяется запросом с If-None-Match
+habit_pages: "OrderedDict[tuple, tuple]" = OrderedDict()
+
 
 async def login_user(auth_data: dict):
     try:
-        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10.0) as client:
-            response = await client.post(
-                "/token",
-                data={"username": auth_data["username"], "password": auth_data["password"]}
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await backend.post(
+            "/token",
+            data={"username": auth_data["username"], "password": auth_data["password"]}
+        )
+        response.raise_for_status()
+        return response.json()
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
@@ -26,69 +26,111 @@ async def login_user(auth_data: dict):
 async def create_user(user_data: dict):
     """Создание пользователя с обработкой ошибок"""
     try:
-        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10.0) as client:
-            response = await client.post("/users/", json=user_data)
-            response.raise_for_status()
-            return response.json()
+        response = await backend.post("/users/", json=user_data)
+        response.raise_for_status()
+        return response.json()
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 
-async def get_habits(telegram_id: int, token: str = None):
-    """Получение списка привычек с обработкой ошибок"""
+async def link_telegram(username: str, telegram_id: int, token: str):
+    """Привязка Telegram-аккаунта к пользователю"""
     try:
-        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10.0) as client:
-            headers = {"Authorization": f"Bearer {token}"} if token else {}
-            response = await client.get(
-                "/habits/",
-                params={"telegram_id": telegram_id},
-                headers=headers
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await backend.put(
+            f"/users/{username}/link_telegram",
+            json={"telegram_id": telegram_id},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        response.raise_for_status()
+        return response.json()
     except Exception as e:
-        logger.error(f"Error in get_habits: {str(e)}", exc_info=True)
         return {"status": "error", "message": str(e)}
 
 
 async def create_habit(habit_data: dict, token: str):
     try:
-        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10.0) as client:
-            response = await client.post(
-                "/habits/",
-                json=habit_data,
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await backend.post(
+            "/habits/",
+            json=habit_data,
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
+async def get_habits_page(telegram_id: int, cursor: str = None, limit: int = 10, token: str = None):
+    """Страница привычек из кэша, если backend подтвердил её ETag ответом 304.
+
+    Курсор следующей страницы backend отдаёт в X-Next-Cursor.
+    """
+    key = (telegram_id, cursor, limit)
+    cached = habit_pages.get(key)
+    try:
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        if cached:
+            headers["If-None-Match"] = cached[0]
+        params = {"telegram_id": telegram_id, "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = await backend.get("/habits/", params=params, headers=headers)
+        if response.status_code == 304 and cached:
+            habit_pages.move_to_end(key)
+            return cached[1]
+        response.raise_for_status()
+        page = {
+            "habits": response.json(),
+            "cursor": cursor,
+            "next_cursor": response.headers.get("X-Next-Cursor")
+        }
+        etag = response.headers.get("ETag")
+        if etag:
+            habit_pages[key] = (etag, page)
+            habit_pages.move_to_end(key)
+            while len(habit_pages) > HABITS_CACHE_SIZE:
+                habit_pages.popitem(last=False)
+        return page
     except Exception as e:
+        logger.error("Error in get_habits_page: %s", e, exc_info=True)
         return {"status": "error", "message": str(e)}
 
 
-async def mark_habit_done(habit_id: int, telegram_id: int):
-    """Отметка привычки выполненной"""
+async def mark_habit_done(habit_id: int, telegram_id: int, include_habits: bool = False):
+    """Отметка привычки выполненной; с include_habits ответ содержит и обновлённый список"""
+    try:
+        response = await backend.post(
+            f"/habits/{habit_id}/complete",
+            params={"include_habits": "true"} if include_habits else None,
+            json={"telegram_id": telegram_id}
+        )
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+async def mark_habits_done(habit_ids: list, telegram_id: int):
+    """Отметка нескольких привычек одним запросом"""
     try:
-        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10.0) as client:
-            response = await client.post(
-                f"/habits/{habit_id}/complete",
-                json={"telegram_id": telegram_id}
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await backend.post(
+            "/habits/complete",
+            json={"telegram_id": telegram_id, "habit_ids": habit_ids}
+        )
+        response.raise_for_status()
+        return response.json()
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 async def update_habit(habit_id: int, token: str, **update_data):
     """Обновление привычки"""
     try:
-        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10.0) as client:
-            response = await client.put(
-                f"/habits/{habit_id}",
-                json=update_data,
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await backend.put(
+            f"/habits/{habit_id}",
+            json=update_data,
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        response.raise_for_status()
+        return response.json()
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
@@ -96,14 +138,33 @@ async def update_habit(habit_id: int, token: str, **update_data):
 async def delete_habit(habit_id: int, telegram_id: int, token: str):
     """Удаление привычки с проверкой владельца"""
     try:
-        async with httpx.AsyncClient(base_url=BASE_URL, timeout=10.0) as client:
-            response = await client.delete(
-                f"/habits/{habit_id}",
-                params={"telegram_id": telegram_id},
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await backend.delete(
+            f"/habits/{habit_id}",
+            params={"telegram_id": telegram_id},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        logger.error("Error in delete_habit: %s", e, exc_info=True)
+        return {"status": "error", "message": str(e)}
+
+
+async def get_digest(telegram_id: int):
+    """Время ежедневной сводки; пустой список — сводка выключена"""
+    try:
+        response = await backend.get("/users/digest", params={"telegram_id": telegram_id})
+        response.raise_for_status()
+        return response.json()
     except Exception as e:
-        logger.error(f"Error in delete_habit: {str(e)}", exc_info=True)
-        return {"status": "error", "message": str(e)}
\ No newline at end of file
+        return {"status": "error", "message": str(e)}
+
+
+async def set_digest(telegram_id: int, times: list):
+    """Включение сводки в указанное время; пустой times возвращает отдельные напоминания"""
+    try:
+        response = await backend.put("/users/digest", json={"telegram_id": telegram_id, "times": times})
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
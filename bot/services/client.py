@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Optional
+
+import httpx
+
+from services.metrics import BACKEND_LATENCY, path_template
+
+BASE_URL = os.getenv("API_URL", "http://backend:8000")
+HTTP2 = os.getenv("BACKEND_HTTP2", "0") == "1"
+MAX_CONNECTIONS = int(os.getenv("BACKEND_MAX_CONNECTIONS", "50"))
+MAX_KEEPALIVE = int(os.getenv("BACKEND_MAX_KEEPALIVE", "20"))
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Размыкается после failure_threshold ошибок подряд и пробует снова через reset_timeout"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_request(self):
+        if self.state == "open":
+            raise CircuitOpenError("Backend временно недоступен")
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            logger.warning("Backend недоступен, запросы приостановлены на %.0f с", self.reset_timeout)
+            self.opened_at = time.monotonic()
+
+
+class BackendClient:
+    """Один httpx.AsyncClient на всё приложение: пул соединений, повторы и circuit breaker"""
+
+    def __init__(
+            self,
+            base_url: str = BASE_URL,
+            timeout: float = 10.0,
+            retries: int = 3,
+            backoff: float = 0.2,
+            backoff_cap: float = 2.0,
+            http2: bool = HTTP2
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+        self.http2 = http2
+        self.breaker = CircuitBreaker()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _create_client(self) -> httpx.AsyncClient:
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("Пакет h2 не установлен, используется HTTP/1.1")
+                http2 = False
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.timeout,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE,
+                keepalive_expiry=60.0
+            )
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    async def start(self):
+        _ = self.client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _should_retry(self, method: str, error: Exception) -> bool:
+        # соединение не установлено — запрос точно не дошёл, повтор безопасен для любого метода
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+            return True
+        return method in IDEMPOTENT_METHODS
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        method = method.upper()
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await self._request(method, url, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            BACKEND_LATENCY.labels(method, path_template(url), status).observe(time.perf_counter() - started)
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        attempt = 0
+        while True:
+            self.breaker.before_request()
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                if response.status_code < 500:
+                    self.breaker.record_success()
+                    return response
+                error = httpx.HTTPStatusError(
+                    f"Server error {response.status_code}", request=response.request, response=response
+                )
+            except httpx.TransportError as e:
+                error = e
+                response = None
+
+            self.breaker.record_failure()
+            attempt += 1
+            if attempt > self.retries or not self._should_retry(method, error):
+                if response is not None:
+                    return response
+                raise error
+            delay = random.uniform(0, min(self.backoff_cap, self.backoff * 2 ** attempt))
+            logger.warning("%s %s: %s, повтор %d через %.2f с", method, url, error, attempt, delay)
+            await asyncio.sleep(delay)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PUT", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", url, **kwargs)
+
+
+backend = BackendClient()
@@ -0,0 +1,86 @@
+import os
+import re
+import time
+
+from prometheus_client import Counter, Histogram, start_http_server
+from telegram import Update
+from telegram.ext import Application, CommandHandler, ConversationHandler
+
+# порт HTTP-сервера с /metrics; 0 — метрики не публикуются
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+HANDLER_LATENCY = Histogram(
+    "bot_handler_duration_seconds", "Обработка update ботом", ["handler"], buckets=LATENCY_BUCKETS
+)
+# ошибки хендлеров PTB перехватывает сам и отдаёт в error_handler, оттуда и считаем
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Ошибки обработки update", ["handler"])
+BACKEND_LATENCY = Histogram(
+    "bot_backend_request_duration_seconds", "Запросы бота к backend, включая повторы",
+    ["method", "path", "status"], buckets=LATENCY_BUCKETS
+)
+
+# id и курсоры в путях и callback_data не должны плодить отдельные ряды
+NUMBER_SEGMENT = re.compile(r"/\d+(?=/|$)")
+USERNAME_SEGMENT = re.compile(r"^/users/[^/]+/")
+
+
+def path_template(url: str) -> str:
+    path = USERNAME_SEGMENT.sub("/users/{username}/", url.split("?", 1)[0])
+    return NUMBER_SEGMENT.sub("/{id}", path)
+
+
+def registered_commands(handlers) -> set:
+    commands = set()
+    for handler in handlers:
+        if isinstance(handler, CommandHandler):
+            commands.update(handler.commands)
+        elif isinstance(handler, ConversationHandler):
+            nested = [*handler.entry_points, *handler.fallbacks]
+            for state_handlers in handler.states.values():
+                nested.extend(state_handlers)
+            commands.update(registered_commands(nested))
+    return commands
+
+
+def handler_name(update: object, commands: set) -> str:
+    """Команда, префикс callback_data или тип update — метка для гистограммы"""
+    if not isinstance(update, Update):
+        return "other"
+    if update.callback_query is not None:
+        prefix = (update.callback_query.data or "").split("_", 1)[0]
+        return f"callback:{prefix}"
+    message = update.effective_message
+    if message is not None and message.text:
+        if message.text.startswith("/"):
+            command = message.text[1:].split(maxsplit=1)[0].split("@", 1)[0].lower()
+            # неизвестные команды пишет кто угодно, в метки они не попадают
+            return f"/{command}" if command in commands else "/unknown"
+        return "text"
+    return "other"
+
+
+class MeteredApplication(Application):
+    """Application, замеряющий время всех хендлеров одного update"""
+
+    _commands = None
+
+    def update_label(self, update: object) -> str:
+        if self._commands is None:
+            self._commands = registered_commands(
+                handler for group in self.handlers.values() for handler in group
+            )
+        return handler_name(update, self._commands)
+
+    async def process_update(self, update: object) -> None:
+        name = self.update_label(update)
+        started = time.perf_counter()
+        try:
+            await super().process_update(update)
+        finally:
+            HANDLER_LATENCY.labels(name).observe(time.perf_counter() - started)
+
+
+def start_metrics_server():
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
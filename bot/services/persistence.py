@@ -0,0 +1,192 @@
+import asyncio
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+from typing import Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+# файл SQLite с user_data (в том числе токенами backend) и состояниями диалогов; пустое значение
+# отключает сохранение. По умолчанию — отдельный том /data, а не каталог с исходниками
+BOT_PERSISTENCE_PATH = os.getenv("BOT_PERSISTENCE_PATH", "/data/bot_state.sqlite3")
+# раз во сколько секунд PTB отдаёт накопленные изменения на запись
+BOT_PERSISTENCE_INTERVAL = float(os.getenv("BOT_PERSISTENCE_INTERVAL", "5"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_data (
+    user_id INTEGER PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (name, key)
+);
+"""
+
+
+class SQLitePersistence(BasePersistence):
+    """user_data и состояния ConversationHandler в локальном SQLite.
+
+    user_data читается не при старте, а при первом update пользователя (refresh_user_data),
+    поэтому перезапуск не зависит от числа пользователей и не требует повторного /login.
+    Изменения, которые PTB отдаёт раз в update_interval, пишутся одной транзакцией;
+    неизменившиеся user_data не перезаписываются.
+    """
+
+    def __init__(self, path: str = BOT_PERSISTENCE_PATH, update_interval: float = BOT_PERSISTENCE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # user_id -> hash сохранённых данных; есть ключ — пользователь уже прочитан из файла
+        self._loaded: Dict[int, int] = {}
+        # None — удалить запись
+        self._pending_users: Dict[int, Optional[bytes]] = {}
+        self._pending_conversations: Dict[Tuple[str, str], Optional[str]] = {}
+        self._write_task: Optional[asyncio.Task] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            # в файле токены: читать его может только владелец процесса
+            os.chmod(self.path, 0o600)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def _execute(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[tuple, object]:
+        # незавершённых диалогов немного: закончившиеся удаляются, поэтому читаем их сразу
+        rows = await asyncio.to_thread(
+            self._execute, "SELECT key, state FROM conversations WHERE name = ?", (name,)
+        )
+        return {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        if user_id in self._loaded:
+            return
+        rows = await asyncio.to_thread(
+            self._execute, "SELECT data FROM user_data WHERE user_id = ?", (user_id,)
+        )
+        if user_id in self._loaded:
+            return
+        if rows:
+            for key, value in pickle.loads(rows[0][0]).items():
+                user_data.setdefault(key, value)
+        self._loaded[user_id] = hash(rows[0][0]) if rows else hash(b"")
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        blob = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL) if data else b""
+        digest = hash(blob)
+        if self._loaded.get(user_id) == digest:
+            return
+        self._loaded[user_id] = digest
+        self._pending_users[user_id] = blob or None
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._loaded[user_id] = hash(b"")
+        self._pending_users[user_id] = None
+        self._schedule_write()
+
+    async def update_conversation(self, name: str, key: Tuple[int, ...], new_state: Optional[object]) -> None:
+        state = None if new_state is None else json.dumps(new_state)
+        self._pending_conversations[(name, json.dumps(list(key)))] = state
+        self._schedule_write()
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    def _schedule_write(self):
+        # PTB вызывает update_* для всех изменившихся пользователей разом;
+        # запись откладывается на следующую итерацию цикла и забирает их одной транзакцией
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write_soon())
+
+    def _take_pending(self) -> tuple:
+        # забираем накопленное в потоке цикла событий, в поток записи уходит уже снимок
+        users, self._pending_users = self._pending_users, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+        return users, conversations
+
+    async def _write_soon(self):
+        await asyncio.sleep(0)
+        try:
+            await asyncio.to_thread(self._write, *self._take_pending())
+        except sqlite3.Error as e:
+            logger.error("Не удалось сохранить состояние бота: %s", e)
+
+    def _write(self, users: Dict[int, Optional[bytes]], conversations: Dict[Tuple[str, str], Optional[str]]):
+        if not users and not conversations:
+            return
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO user_data (user_id, data) VALUES (?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET data = excluded.data",
+                [(user_id, blob) for user_id, blob in users.items() if blob is not None]
+            )
+            self.conn.executemany(
+                "DELETE FROM user_data WHERE user_id = ?",
+                [(user_id,) for user_id, blob in users.items() if blob is None]
+            )
+            self.conn.executemany(
+                "INSERT INTO conversations (name, key, state) VALUES (?, ?, ?) "
+                "ON CONFLICT (name, key) DO UPDATE SET state = excluded.state",
+                [(name, key, state) for (name, key), state in conversations.items() if state is not None]
+            )
+            self.conn.executemany(
+                "DELETE FROM conversations WHERE name = ? AND key = ?",
+                [(name, key) for (name, key), state in conversations.items() if state is None]
+            )
+        logger.debug("Сохранено user_data: %d, диалогов: %d", len(users), len(conversations))
+
+    async def flush(self) -> None:
+        if self._write_task is not None:
+            await asyncio.gather(self._write_task, return_exceptions=True)
+        await asyncio.to_thread(self._write, *self._take_pending())
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,67 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# сколько update обрабатывается одновременно; 1 — строго по очереди, как раньше
+BOT_CONCURRENCY = int(os.getenv("BOT_CONCURRENCY", "32"))
+
+
+def update_key(update: object) -> Optional[int]:
+    """Пользователь, чьи update нельзя обрабатывать параллельно; None — без ограничений"""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка update разных пользователей, по порядку — одного.
+
+    ConversationHandler хранит состояние диалога по пользователю и чату: если два
+    сообщения одного пользователя обработать одновременно, второе увидит старое
+    состояние. Поэтому update одного пользователя ждут друг друга, а разных — нет.
+    """
+
+    def __init__(self, max_concurrent_updates: int = BOT_CONCURRENCY):
+        super().__init__(max_concurrent_updates)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._waiting: Dict[int, int] = {}
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        # очередь пользователя проходится до общего семафора: иначе пачка сообщений
+        # одного пользователя занимала бы все слоты, ожидая саму себя
+        key = update_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._waiting[key] = self._waiting.get(key, 0) + 1
+        try:
+            async with lock:
+                await super().process_update(update, coroutine)
+        finally:
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                del self._waiting[key]
+                del self._locks[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @property
+    def active_users(self) -> int:
+        return len(self._locks)